@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def write_atomic(path, write):
+    """Écrit via write(chemin temporaire) puis renomme : jamais de fichier à moitié écrit
+
+    Chaque appel a son propre fichier temporaire (mkstemp, dans le dossier de path) : deux
+    écritures concurrentes du même fichier, par des processus ou des threads, ne se gênent
+    pas. Le fichier temporaire est supprimé si l'écriture échoue.
+    """
+    fd, temp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix='.tmp',
+                                     dir=os.path.dirname(os.path.abspath(path)))
+    os.close(fd)
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+
+def content_hash(content):
+    """Empreinte SHA-256 du contenu d'un fichier importé"""
+    return hashlib.sha256(content).hexdigest()
+
+
+class ParsedUploadCache:
+    """Cache LRU borné des pointages déjà transformés, indexé par empreinte du fichier"""
+
+    def __init__(self, max_entries=16, max_bytes=512 * 2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # empreinte -> (DataFrame, taille en octets)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        """Copie du DataFrame en cache (les étapes suivantes le modifient en place), ou None"""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[0].copy()
+
+    def put(self, digest, df):
+        size = int(df.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if digest in self._entries:
+                self._size -= self._entries.pop(digest)[1]
+            self._entries[digest] = (df.copy(), size)
+            self._size += size
+            # Éviction des moins récemment utilisés
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._size -= self._entries.popitem(last=False)[1][1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+def canonical_params(analysis_params):
+    """Forme canonique des paramètres d'analyse, indépendante de l'ordre de saisie
+
+    Seuls restDays, holidays, leavePeriods et contractEnds influencent le résultat.
+    Pour un même employé, la dernière configuration de jours de repos l'emporte,
+    comme dans /upload.
+    """
+    rest_days = {}
+    for config in analysis_params.get('restDays', []):
+        rest_days[config['employeeName']] = sorted(config['days'])
+    holidays = sorted({h['date'] for h in analysis_params.get('holidays', [])})
+    leave_periods = sorted(
+        [leave['employeeName'], leave['startDate'], leave['endDate'],
+         leave.get('leaveType', 'Congé annuel')]
+        for leave in analysis_params.get('leavePeriods', [])
+    )
+    contract_ends = {
+        employee: end_date
+        for employee, end_date in analysis_params.get('contractEnds', {}).items()
+        if end_date
+    }
+    return json.dumps({
+        'restDays': rest_days,
+        'holidays': holidays,
+        'leavePeriods': leave_periods,
+        'contractEnds': contract_ends
+    }, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+
+
+def analysis_key(digest, analysis_params):
+    """Clé d'un résultat d'analyse : empreinte du fichier et paramètres canoniques"""
+    return content_hash(f"{digest}:{canonical_params(analysis_params)}".encode('utf-8'))
+
+
+class AnalysisResultCache:
+    """Résultats d'analyse déjà calculés, en mémoire et sur disque
+
+    Le niveau disque (un JSON par clé) survit au redémarrage du serveur ; il est
+    limité à max_entries résultats, les moins récemment utilisés étant supprimés avec
+    les fichiers qu'ils référencent (répertoire du rapport). Le niveau mémoire garde les
+    max_memory_entries derniers résultats pour éviter de relire le JSON.
+    """
+
+    def __init__(self, directory, max_entries=64, max_memory_entries=8):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_memory_entries = max_memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()  # clé -> {"files": [...], "response": {...}}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def keys(self):
+        """Clés des résultats conservés sur disque"""
+        return [name[:-len('.json')] for name in os.listdir(self.directory) if name.endswith('.json')]
+
+    def get(self, key):
+        """Réponse en cache (copie), ou None si absente ou si un de ses fichiers a disparu"""
+        with self._lock:
+            entry = self._memory.get(key)
+            path = self._path(key)
+            if entry is None and os.path.exists(path):
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        entry = json.load(f)
+                except (OSError, ValueError):
+                    entry = None
+            if entry is None or not all(os.path.exists(p) for p in entry['files']):
+                if entry is not None:
+                    self._discard(key, entry)
+                self.misses += 1
+                return None
+
+            # Date d'accès sur disque pour l'éviction LRU
+            if os.path.exists(path):
+                os.utime(path)
+            self._remember(key, entry)
+            self.hits += 1
+            return dict(entry['response'])
+
+    def put(self, key, response, files=()):
+        entry = {"files": list(files), "response": response}
+        path = self._path(key)
+
+        def write(temp_path):
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+
+        with self._lock:
+            # Écriture atomique : un redémarrage ne laisse pas de JSON tronqué
+            write_atomic(path, write)
+            self._remember(key, entry)
+            self._evict()
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _discard(self, key, entry):
+        self._memory.pop(key, None)
+        for file_path in [self._path(key)] + entry['files']:
+            if os.path.isdir(file_path):
+                shutil.rmtree(file_path)
+            elif os.path.exists(file_path):
+                os.unlink(file_path)
+
+    def _evict(self):
+        keys = self.keys()
+        if len(keys) <= self.max_entries:
+            return
+        keys.sort(key=lambda k: os.path.getmtime(self._path(k)))
+        for key in keys[:len(keys) - self.max_entries]:
+            try:
+                with open(self._path(key), encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                entry = {"files": []}
+            self._discard(key, entry)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self.keys()),
+                "memory_entries": len(self._memory),
+                "hits": self.hits,
+                "misses": self.misses
+            }
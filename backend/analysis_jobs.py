@@ -0,0 +1,140 @@
+import asyncio
+import multiprocessing
+import time
+import uuid
+
+from fastapi import HTTPException
+
+# Étapes d'une analyse, dans l'ordre d'exécution
+JOB_STAGES = ('parse', 'rest_days', 'complete', 'statistics', 'absences', 'report')
+
+
+class StageReporter:
+    """Enregistre l'étape en cours d'une tâche
+
+    Sérialisable : il peut être passé aux fonctions exécutées dans le pool de processus,
+    store étant alors un dictionnaire partagé (multiprocessing.Manager).
+    """
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+
+    def __call__(self, stage):
+        self.store[self.job_id] = stage
+
+
+class AnalysisJob:
+    def __init__(self):
+        self.id = str(uuid.uuid4())
+        self.status = 'queued'  # queued, running, done, failed
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+
+class JobQueue:
+    """File locale de tâches d'analyse, exécutées en arrière-plan sans broker externe
+
+    max_running coroutines consomment la file ; chaque tâche est une fonction asynchrone
+    qui reçoit un StageReporter. Les tâches terminées sont conservées ttl secondes.
+    Avec shared_stages=True, les étapes sont stockées dans un dictionnaire partagé entre
+    processus pour que les fonctions du pool puissent les signaler.
+    """
+
+    def __init__(self, max_running=1, ttl=3600, shared_stages=False):
+        self.max_running = max_running
+        self.ttl = ttl
+        self.shared_stages = shared_stages
+        self.jobs = {}
+        self._stages = None
+        self._manager = None
+        self._pending = None
+        self._workers = []
+
+    def _stage_store(self):
+        if self._stages is None:
+            if self.shared_stages:
+                self._manager = multiprocessing.Manager()
+                self._stages = self._manager.dict()
+            else:
+                self._stages = {}
+        return self._stages
+
+    def submit(self, run):
+        """Ajoute une tâche à la file et la renvoie immédiatement"""
+        self._purge()
+        if self._pending is None:
+            self._pending = asyncio.Queue()
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.max_running)]
+
+        job = AnalysisJob()
+        self.jobs[job.id] = job
+        self._pending.put_nowait((job, run))
+        return job
+
+    async def _work(self):
+        while True:
+            job, run = await self._pending.get()
+            job.status = 'running'
+            try:
+                job.result = await run(StageReporter(self._stage_store(), job.id))
+                job.status = 'done'
+            except HTTPException as e:
+                job.error = e.detail
+                job.status = 'failed'
+            except Exception as e:
+                job.error = str(e)
+                job.status = 'failed'
+            finally:
+                job.finished = time.time()
+                self._pending.task_done()
+
+    def _purge(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.finished is not None and now - job.finished > self.ttl]
+        for job_id in expired:
+            del self.jobs[job_id]
+            if self._stages is not None:
+                self._stages.pop(job_id, None)
+
+    def status(self, job_id):
+        """État d'une tâche pour le client (résultat inclus une fois terminée), ou None"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+
+        stage = self._stages.get(job_id) if self._stages is not None else None
+        if job.status == 'done':
+            progress = 1.0
+        elif stage in JOB_STAGES:
+            progress = JOB_STAGES.index(stage) / len(JOB_STAGES)
+        else:
+            progress = 0.0
+
+        status = {
+            "job_id": job.id,
+            "status": job.status,
+            "stage": stage,
+            "stages": list(JOB_STAGES),
+            "progress": round(progress, 2),
+            "elapsed": round((job.finished or time.time()) - job.created, 1)
+        }
+        if job.status == 'queued':
+            status["position"] = sum(
+                1 for other in self.jobs.values()
+                if other.status == 'queued' and other.created <= job.created
+            )
+        if job.status == 'done':
+            status["result"] = job.result
+        if job.status == 'failed':
+            status["error"] = job.error
+        return status
+
+    async def shutdown(self):
+        for worker in self._workers:
+            worker.cancel()
+        if self._manager is not None:
+            self._manager.shutdown()
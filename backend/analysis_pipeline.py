@@ -0,0 +1,349 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+
+from presence_analyzer import PresenceAnalyzer
+from report_editor import EditableReport
+from report_writer import ReportWriter, load_report_tables, save_report_tables
+from spreadsheet_readers import read_spreadsheet
+
+# Fonctions exécutées hors de la boucle d'événements (pool de processus) : elles ne
+# reçoivent et ne renvoient que des objets sérialisables (chemins, DataFrame, dict).
+
+
+def format_timedelta(td):
+    if pd.isnull(td) or td == timedelta(0):
+        return "00:00"
+    total_seconds = int(td.total_seconds())
+    hours = total_seconds // 3600
+    minutes = (total_seconds % 3600) // 60
+    return f"{hours:02d}:{minutes:02d}"
+
+
+# Colonnes sommées pour les totaux de calculate_detailed_stats
+TOTAL_COLUMNS = ['Retard', 'Heures_Sup_50', 'Heures_Sup_100', 'Temps_Travail']
+
+
+def totals_from_sums(sums):
+    """Totaux de calculate_detailed_stats à partir des sommes cumulées par groupe d'employés"""
+    return {
+        "total_retards": format_timedelta(sums['Retard']),
+        "total_heures_sup_50": format_timedelta(sums['Heures_Sup_50']),
+        "total_heures_sup_100": format_timedelta(sums['Heures_Sup_100']),
+        "total_temps_travail": format_timedelta(sums['Temps_Travail']),
+        "moyenne_temps_travail": format_timedelta(sums['Temps_Travail'] / sums['days'])
+            if sums['days'] else format_timedelta(None)
+    }
+
+
+def calculate_detailed_stats(stats_df):
+    """Calcule les statistiques détaillées"""
+    # Conversion des données quotidiennes en format JSON pour le frontend
+    daily_stats = []
+    for _, row in stats_df.iterrows():
+        daily_stats.append({
+            'Date': row['Date'].strftime('%Y-%m-%d') if isinstance(row['Date'], (datetime, pd.Timestamp)) else row['Date'],
+            'Name': row['Name'],
+            'Retard': row['Retard'],
+            'Depart_Anticipe': row['Depart_Anticipe'],
+            'Heures_Sup_50': row['Heures_Sup_50'],
+            'Heures_Sup_100': row['Heures_Sup_100'],
+            'Pause_Effective': row['Pause_Effective'],
+            'Temps_Travail': row['Temps_Travail'],
+            'Penalites': row['Penalites']
+        })
+    
+    total_stats = {
+        # Statistiques totales
+        "total_retards": format_timedelta(stats_df['Retard'].sum()),
+        "total_heures_sup_50": format_timedelta(stats_df['Heures_Sup_50'].sum()),
+        "total_heures_sup_100": format_timedelta(stats_df['Heures_Sup_100'].sum()),
+        "total_temps_travail": format_timedelta(stats_df['Temps_Travail'].sum()),
+        "moyenne_temps_travail": format_timedelta(stats_df['Temps_Travail'].mean()),
+        "stats_par_employe": [],
+        "daily_records": daily_stats  # Ajout des données quotidiennes
+    }
+    
+    # Statistiques par employé
+    for name, group in stats_df.groupby('Name'):
+        employee_stats = {
+            "nom": name,
+            "retards": format_timedelta(group['Retard'].sum()),
+            "heures_sup": format_timedelta(group['Heures_Sup_50'].sum() + group['Heures_Sup_100'].sum()),
+            "temps_travail": format_timedelta(group['Temps_Travail'].sum()),
+            "jours_travailles": len(group[group['Temps_Travail'] > timedelta(0)])
+        }
+        total_stats["stats_par_employe"].append(employee_stats)
+
+    return total_stats
+
+
+def parse_export(path, digest=None, cache_dir=None):
+    """Transforme un export badgeuse (fichier sur disque) en pointages journaliers compacts
+
+    Avec cache_dir, les pointages normalisés y sont conservés au format Arrow et relus
+    tant que le même fichier (même empreinte digest) est importé.
+    """
+    analyzer = PresenceAnalyzer()
+    analyzer.compact = True
+    if cache_dir is not None:
+        analyzer.punch_cache = True
+        analyzer.punch_cache_dir = cache_dir
+    return analyzer.transform_raw_data(path, digest)
+
+
+def detect_employees(attendance_data):
+    """Employés présents dans l'export et jours de repos détectés"""
+    analyzer = PresenceAnalyzer()
+    analyzer.compact = True
+    return attendance_data['Name'].unique().tolist(), analyzer.detect_rest_days(attendance_data)
+
+
+def report_stage(progress, stage):
+    if progress is not None:
+        progress(stage)
+
+
+def configure_analyzer(attendance_data, analysis_params, progress=None, detected_rest_days=None):
+    """PresenceAnalyzer configuré d'après les paramètres d'analyse
+
+    detected_rest_days remplace la détection des jours de repos sur attendance_data (jours
+    détectés sur un historique plus long). Renvoie (analyzer, jours fériés, périodes de
+    congés par employé).
+    """
+    analyzer = PresenceAnalyzer()
+    analyzer.compact = True
+
+    contract_ends = analysis_params.get('contractEnds', {})
+    for employee, end_date in contract_ends.items():
+        if end_date:
+            analyzer.set_contract_end(employee, end_date)
+
+    # Configuration des jours de repos : détection automatique par défaut,
+    # remplacée par la saisie du client quand elle existe
+    report_stage(progress, 'rest_days')
+    if detected_rest_days is None:
+        detected_rest_days = analyzer.detect_rest_days(attendance_data)
+    analyzer.employee_rest_days.update(detected_rest_days)
+    for rest_day_config in analysis_params.get('restDays', []):
+        employee = rest_day_config['employeeName']
+        days = rest_day_config['days']
+        analyzer.employee_rest_days[employee] = days
+
+    # Conversion des dates de congés
+    holidays = [datetime.strptime(h['date'], '%Y-%m-%d').date() 
+               for h in analysis_params.get('holidays', [])]
+
+    # Préparation des périodes de congés
+    employee_leave_periods = {}
+    for leave in analysis_params.get('leavePeriods', []):
+        employee = leave['employeeName']
+        start = datetime.strptime(leave['startDate'], '%Y-%m-%d').date()
+        end = datetime.strptime(leave['endDate'], '%Y-%m-%d').date()
+        leave_type = leave.get('leaveType', 'Congé annuel')
+        if employee not in employee_leave_periods:
+            employee_leave_periods[employee] = []
+
+        employee_leave_periods[employee].append((start, end, leave_type))
+
+    return analyzer, holidays, employee_leave_periods
+
+
+def analyze_upload(attendance_data, analysis_params, report_id, report_dir, progress=None):
+    """Analyse complète d'un export : statistiques, absences et tables du rapport (dans report_dir)
+
+    Renvoie la réponse de /upload (sans le nom du fichier), prête à être sérialisée.
+    progress, s'il est fourni, est appelé avec le nom de chaque étape au moment où elle commence.
+    """
+    results = analyze_employees(attendance_data, analysis_params, progress)
+    return write_report([results], analysis_params, report_id, report_dir, progress=progress)
+
+
+def analyze_employees(attendance_data, analysis_params, progress=None):
+    """Statistiques, absences et pointages complétés d'un groupe d'employés (mode compact)
+
+    Les calculs étant indépendants d'un employé à l'autre, les résultats de plusieurs
+    groupes réunis par write_report donnent ceux de l'analyse complète.
+    """
+    analyzer, holidays, employee_leave_periods = configure_analyzer(attendance_data, analysis_params, progress)
+
+    # Complétion des données
+    report_stage(progress, 'complete')
+    completed_data, imputations = analyzer.complete_missing_data(
+        attendance_data, with_counts=True
+    )
+
+    # Calendrier des statuts (repos, fériés, congés, fin de contrat), construit une fois
+    calendar = analyzer.build_calendar(completed_data, holidays, employee_leave_periods)
+
+    # Calcul des statistiques complètes
+    report_stage(progress, 'statistics')
+    stats = analyzer.calculate_statistics(completed_data)
+
+    # Calcul des absences en excluant les jours de repos
+    report_stage(progress, 'absences')
+    absences = stats[
+        (stats['Temps_Travail'] == timedelta(0)) & 
+        (~calendar.is_rest_day(stats['Name'], stats['Date']))
+    ]
+
+    net_absences, net_absences_total, covered_absences = analyzer.calculate_net_absences(
+        absences, holidays, employee_leave_periods, with_covered=True
+    )
+
+    return {
+        'stats': stats,
+        'net_absences': net_absences,
+        'net_absences_total': net_absences_total,
+        'covered_absences': covered_absences,
+        'imputations': imputations,
+        'records': len(completed_data),
+        'bytes': analyzer.bytes_per_day(completed_data) * len(completed_data)
+    }
+
+
+def write_report(results, analysis_params, report_id, report_dir, detailed_stats=None, progress=None):
+    """Tables du rapport (dans report_dir) et réponse de /upload à partir des résultats
+    d'analyze_employees d'un ou plusieurs groupes d'employés
+
+    detailed_stats évite de recalculer les statistiques de l'interface quand elles ont déjà
+    été envoyées groupe par groupe (/upload/stream).
+    """
+    analyzer = PresenceAnalyzer()
+    _, holidays, employee_leave_periods = configure_analyzer(None, analysis_params, detected_rest_days={})
+
+    # Retour aux types habituels pour le rapport et l'interface
+    tables = {
+        name: pd.concat([result[name] for result in results], ignore_index=True)
+        for name in ('stats', 'net_absences', 'net_absences_total', 'covered_absences', 'imputations')
+    }
+    records = sum(result['records'] for result in results)
+    bytes_per_day = sum(result['bytes'] for result in results) / max(records, 1)
+    stats = analyzer.expand(tables['stats'])
+    net_absences = analyzer.expand(tables['net_absences'])
+    covered_absences = analyzer.expand(tables['covered_absences'])
+    imputations = tables['imputations']
+
+    # Tables du rapport, enregistrées telles quelles : le classeur Excel et les exports
+    # (CSV, Parquet, Arrow) n'en sont générés qu'à la demande
+    report_stage(progress, 'report')
+    employee_stats = stats.groupby('Name').agg({
+        'Retard': 'sum',
+        'Depart_Anticipe': 'sum',
+        'Heures_Sup_50': 'sum',
+        'Heures_Sup_100': 'sum',
+        'Pause_Effective': 'sum',
+        'Temps_Travail': 'sum',
+        'Penalites': 'sum'
+    }).reset_index()
+
+    # Congés
+    leave_data = []
+    for emp, periods in employee_leave_periods.items():
+        for start, end, leave_type in periods:
+            nb_jours = (end - start).days + 1
+            leave_data.append({
+                'Employe': emp,
+                'Debut': start.strftime('%Y-%m-%d'),
+                'Fin': end.strftime('%Y-%m-%d'),
+                'Type': leave_type,
+                'Nombre_Jours': nb_jours
+            })
+
+    save_report_tables({
+        'Statistiques_Detaillees': stats,
+        'Statistiques_Par_Employe': employee_stats,
+        'Absences_Nettes': net_absences,
+        'Total_Absences': tables['net_absences_total'],
+        'Absences_Justifiees': covered_absences[['Name', 'Date', 'Jour_Ferie', 'Type_Conge']],
+        'Pointages_Completes': imputations,
+        'Jours_Feries': pd.DataFrame({'Jours_Feries': holidays}),
+        'Conges': pd.DataFrame(leave_data)
+    }, report_dir)
+
+    # Calcul des statistiques pour l'interface web (congés : mêmes lignes que le rapport)
+    if detailed_stats is None:
+        detailed_stats = calculate_detailed_stats(stats)
+
+    return jsonable_encoder({
+        "status": "success",
+        "report_id": report_id,
+        "analysis": {
+            "total_records": records,
+            "employees": stats['Name'].nunique(),
+            "date_range": {
+                "start": stats['Date'].min().strftime('%Y-%m-%d'),
+                "end": stats['Date'].max().strftime('%Y-%m-%d')
+            },
+            "bytes_per_employee_day": round(bytes_per_day, 1)
+        },
+        "detailed_stats": detailed_stats,
+        "conges": leave_data,
+        "absences": net_absences[['Name', 'Date']].to_dict('records'),
+        "absences_justifiees": covered_absences[['Name', 'Date', 'Type_Conge']]
+            .dropna(subset=['Type_Conge']).to_dict('records'),
+        "pointages_completes": imputations.to_dict('records'),
+        "message": "Fichier analysé avec succès"
+    })
+
+
+def employee_batch_stats(attendance_data, analysis_params):
+    """Statistiques d'un groupe d'employés, pour l'envoi progressif de /upload/stream
+
+    Renvoie les entrées stats_par_employe et daily_records de calculate_detailed_stats,
+    les sommes nécessaires aux totaux, et les résultats d'analyze_employees réunis
+    ensuite par write_report pour le rapport.
+    """
+    results = analyze_employees(attendance_data, analysis_params)
+    stats = PresenceAnalyzer().expand(results['stats'])
+    detailed_stats = calculate_detailed_stats(stats)
+
+    return jsonable_encoder({
+        "stats_par_employe": detailed_stats["stats_par_employe"],
+        "daily_records": detailed_stats["daily_records"]
+    }), {
+        "days": int(stats['Temps_Travail'].count()),
+        **{col: stats[col].sum() for col in TOTAL_COLUMNS}
+    }, results
+
+
+def read_report(path):
+    """Lit l'onglet Statistiques_Detaillees d'un rapport Excel importé
+
+    Renvoie (employés, lignes au format JSON, EditableReport gardé en session).
+    """
+    stats_df = read_spreadsheet(path, sheet_name='Statistiques_Detaillees')
+    # Cellules vides -> None (NaN n'est pas du JSON valide)
+    records = stats_df.astype(object).where(stats_df.notna(), None).to_dict('records')
+    return stats_df['Name'].unique().tolist(), records, EditableReport(stats_df)
+
+
+def report_session(report_dir):
+    """EditableReport des statistiques journalières d'un rapport d'analyse (/upload)"""
+    return EditableReport(load_report_tables(report_dir)['Statistiques_Detaillees'])
+
+
+def write_modified_report(original_data, modifications, employee, report_path):
+    """Applique les modifications aux données du rapport et écrit le rapport modifié"""
+    report = EditableReport(original_data)
+
+    # Appliquer les modifications (index employé-date, totaux mis à jour au passage)
+    report.apply(employee, modifications)
+    write_edited_report(report, modifications, employee, report_path)
+
+
+def write_edited_report(report, modifications, employee, report_path):
+    """Écrit le rapport modifié d'un EditableReport dont les modifications sont appliquées"""
+    with ReportWriter(report_path) as writer:
+        # Données modifiées
+        writer.write_sheet('Statistiques_Detaillees', report.df, report.duration_columns)
+
+        # Historique des modifications
+        history_df = pd.DataFrame(modifications)
+        history_df['employee'] = employee
+        history_df['timestamp'] = datetime.now().isoformat()
+        writer.write_sheet('Historique_Modifications', history_df)
+
+        # Nouvelles statistiques de l'employé
+        writer.write_sheet('Resume_Modifications', report.summary(employee))
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class AnalysisSession:
+    """Données d'un rapport gardées côté serveur (EditableReport) pendant leur édition
+
+    lock sérialise les requêtes d'une même session : les modifications d'une requête ne
+    sont pas appliquées pendant l'écriture du rapport d'une autre.
+    """
+
+    def __init__(self, session_id, report):
+        self.id = session_id
+        self.report = report
+        self.lock = asyncio.Lock()
+        self.last_used = time.time()
+
+
+class SessionStore:
+    """Sessions d'analyse en mémoire : l'éditeur n'envoie que ses modifications
+
+    Limité à max_sessions (les moins récemment utilisées sont retirées) ; une session
+    inutilisée pendant ttl secondes expire.
+    """
+
+    def __init__(self, max_sessions=32, ttl=3600):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()  # identifiant -> AnalysisSession
+        self._lock = threading.Lock()
+
+    def create(self, report):
+        """Ajoute une session pour report sous un nouvel identifiant ; renvoie la session
+
+        Chaque ouverture a sa propre copie des données : les modifications d'un utilisateur
+        ne sont jamais vues par un autre, même sur le rapport d'un même fichier.
+        """
+        session = AnalysisSession(str(uuid.uuid4()), report)
+        with self._lock:
+            self._sessions[session.id] = session
+            self._sessions.move_to_end(session.id)
+            self._purge()
+        return session
+
+    def get(self, session_id):
+        """Session active, ou None si elle n'existe pas ou a expiré"""
+        with self._lock:
+            self._purge()
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            self._sessions.move_to_end(session_id)
+            session.last_used = time.time()
+            return session
+
+    def _purge(self):
+        now = time.time()
+        for session_id in [key for key, session in self._sessions.items()
+                           if now - session.last_used > self.ttl]:
+            del self._sessions[session_id]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "rows": sum(len(session.report.df) for session in self._sessions.values())
+            }
@@ -0,0 +1,243 @@
+import argparse
+import os
+import tempfile
+import time as clock
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from presence_analyzer import PresenceAnalyzer, PUNCH_COLUMNS
+from analysis_pipeline import configure_analyzer, format_timedelta
+from report_writer import ReportWriter, DURATION_COLUMNS
+from incremental_analysis import IncrementalAnalysis
+from spreadsheet_readers import available_backends, detect_format, read_spreadsheet
+
+
+def generate_punches(n_employees=200, n_days=120, seed=0):
+    """Génère un journal de pointages synthétique au format de l'export badgeuse"""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2024-01-01')
+    rows = []
+    for e in range(n_employees):
+        name = f"Employe_{e:04d}"
+        for d in range(n_days):
+            if rng.random() < 0.1:
+                continue  # Journée sans pointage
+            day = start + pd.Timedelta(days=d)
+            seconds = np.sort(rng.integers(6 * 3600, 23 * 3600, size=rng.integers(0, 6)))
+            for i, s in enumerate(seconds):
+                status = 'C/In' if (i % 2 == 0) ^ (rng.random() < 0.15) else 'C/Out'
+                stamp = day + pd.Timedelta(seconds=int(s))
+                rows.append((name, stamp.strftime('%d/%m/%Y %H:%M:%S'), status))
+    return pd.DataFrame(rows, columns=['Name', 'Date/Time', 'Status'])
+
+
+def _same_frame(left, right):
+    """Compare deux frames en confondant None et NaN (valeurs vides des colonnes objet)"""
+    def normalize(df):
+        return df.astype(object).where(df.notna(), None)
+    pd.testing.assert_frame_equal(normalize(left), normalize(right))
+
+
+def _timed(func, *args):
+    start = clock.perf_counter()
+    result = func(*args)
+    return result, clock.perf_counter() - start
+
+
+def bench_transform(raw):
+    """Compare le moteur colonne de transform_punches avec l'ancien groupby().apply"""
+    vectorized, legacy = PresenceAnalyzer(), PresenceAnalyzer()
+    legacy.vectorized = False
+
+    fast, fast_time = _timed(vectorized.transform_punches, raw.copy())
+    slow, slow_time = _timed(legacy.transform_punches, raw.copy())
+    _same_frame(fast, slow)
+
+    print(f"transform_punches : colonne {fast_time:.3f}s, apply {slow_time:.3f}s, "
+          f"gain x{slow_time / fast_time:.1f}")
+
+
+def bench_statistics(raw):
+    """Compare le moteur colonne de calculate_statistics avec l'ancien apply(axis=1)"""
+    vectorized, legacy = PresenceAnalyzer(), PresenceAnalyzer()
+    legacy.vectorized = False
+    completed = vectorized.complete_missing_data(vectorized.transform_punches(raw.copy()))
+
+    fast, fast_time = _timed(vectorized.calculate_statistics, completed)
+    slow, slow_time = _timed(legacy.calculate_statistics, completed)
+    _same_frame(fast, slow)
+
+    print(f"calculate_statistics ({len(completed)} employés-jours) : colonne {fast_time:.3f}s, "
+          f"apply {slow_time:.3f}s, gain x{slow_time / fast_time:.1f}")
+
+
+def bench_memory(raw):
+    """Compare la mémoire des représentations objet et compacte sur tout le pipeline"""
+    for compact in (False, True):
+        analyzer = PresenceAnalyzer()
+        analyzer.compact = compact
+        tracemalloc.start()
+        completed = analyzer.complete_missing_data(analyzer.transform_punches(raw.copy()))
+        analyzer.calculate_statistics(completed)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        label = "compacte" if compact else "objet"
+        print(f"représentation {label} : {analyzer.bytes_per_day(completed):.0f} octets par employé-jour, "
+              f"pic {peak / 2**20:.1f} Mo")
+
+
+def _report_sheets(stats):
+    """Feuilles de statistiques du rapport /upload : détail journalier et cumul par employé"""
+    employee_stats = stats.groupby('Name')[DURATION_COLUMNS].sum().reset_index()
+    return {'Statistiques_Detaillees': stats, 'Statistiques_Par_Employe': employee_stats}
+
+
+def _write_report_pandas(sheets, path):
+    """Ancienne écriture : formatage valeur par valeur puis pd.ExcelWriter (openpyxl)"""
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for name, df in sheets.items():
+            df = df.copy()
+            for col in DURATION_COLUMNS:
+                if col in df.columns:
+                    df[col] = df[col].apply(format_timedelta)
+            df.to_excel(writer, sheet_name=name, index=False)
+
+
+def _write_report_streaming(sheets, path):
+    with ReportWriter(path) as writer:
+        for name, df in sheets.items():
+            writer.write_sheet(name, df, DURATION_COLUMNS)
+
+
+def bench_report(raw):
+    """Compare l'écriture du rapport Excel en mode écriture seule avec pd.ExcelWriter"""
+    analyzer = PresenceAnalyzer()
+    analyzer.compact = True
+    completed = analyzer.complete_missing_data(analyzer.transform_punches(raw.copy()))
+    sheets = _report_sheets(analyzer.expand(analyzer.calculate_statistics(completed)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = {}
+        for label, write in (("pandas", _write_report_pandas), ("écriture seule", _write_report_streaming)):
+            path = os.path.join(directory, f"{label}.xlsx")
+            _, elapsed = _timed(write, sheets, path)
+            # Mémoire mesurée à part : tracemalloc ralentit fortement l'écriture
+            tracemalloc.start()
+            write(sheets, path)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results[label] = (elapsed, peak, path)
+
+        # Même contenu une fois relu
+        for name in sheets:
+            _same_frame(pd.read_excel(results["pandas"][2], sheet_name=name),
+                        pd.read_excel(results["écriture seule"][2], sheet_name=name))
+
+    rows = len(sheets['Statistiques_Detaillees'])
+    for label, (elapsed, peak, _) in results.items():
+        print(f"rapport Excel {label} ({rows} lignes) : {elapsed:.3f}s, "
+              f"{rows / elapsed:.0f} lignes/s, pic {peak / 2**20:.1f} Mo")
+
+
+def _export_workbook(raw, path):
+    """Classeur .xlsx au format de l'export badgeuse, avec ses colonnes non utilisées"""
+    export = raw.copy()
+    export.insert(0, 'Department', 'Production')
+    export['No.'] = np.arange(len(export)) % 500
+    export['Location ID'] = 1
+    export['ID Number'] = ''
+    export['VerifyCode'] = 'FP'
+    export['CardNo'] = ''
+    with ReportWriter(path) as writer:
+        writer.write_sheet('Sheet1', export)
+
+
+def bench_readers(raw, export_path=None):
+    """Compare les moteurs de lecture des classeurs, avec et sans restriction de colonnes
+
+    Sans export réel (--export), un .xlsx est généré à partir des pointages synthétiques.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        if export_path is None:
+            export_path = os.path.join(directory, 'export.xlsx')
+            _export_workbook(raw, export_path)
+
+        file_format = detect_format(export_path)
+        reference = None
+        for backend in available_backends(file_format):
+            for usecols in (None, PUNCH_COLUMNS):
+                data, elapsed = _timed(read_spreadsheet, export_path, 0, usecols, backend)
+                # Mêmes pointages quel que soit le moteur
+                if reference is None:
+                    reference = data[PUNCH_COLUMNS]
+                _same_frame(data[PUNCH_COLUMNS], reference)
+
+                columns = "colonnes utiles" if usecols else "toutes colonnes"
+                print(f"lecture {file_format} {backend} ({columns}, {len(data)} lignes) : {elapsed:.3f}s")
+
+
+def bench_incremental(raw, overlap=5):
+    """Compare la mise à jour incrémentale d'un historique avec l'analyse complète
+
+    L'historique est alimenté par des exports mensuels qui se chevauchent de overlap jours ;
+    seule l'intégration du dernier export est mesurée. Les jours de repos sont fixés pour
+    tous les employés : l'historique les détecte mois par mois, l'analyse complète sur toute
+    la période, et seuls des jours de repos saisis donnent les mêmes résultats.
+    """
+    analyzer = PresenceAnalyzer()
+    analyzer.compact = True
+    days = pd.to_datetime(raw['Date/Time'], format='%d/%m/%Y %H:%M:%S').dt.normalize()
+    offsets = (days - days.min()).dt.days
+    starts = list(range(0, offsets.max() + 1, 30))
+    params = {'restDays': [{'employeeName': name, 'days': analyzer.default_rest_days()}
+                           for name in raw['Name'].unique()]}
+
+    with tempfile.TemporaryDirectory() as directory:
+        history = IncrementalAnalysis(directory, params)
+        for start in starts:
+            export = raw[(offsets >= max(start - overlap, 0)) & (offsets < start + 30)]
+            attendance_data = analyzer.transform_punches(export.copy())
+            result, elapsed = _timed(history.update, attendance_data)
+
+        def full_analysis():
+            attendance_data = analyzer.transform_punches(raw.copy())
+            full, holidays, employee_leave_periods = configure_analyzer(attendance_data, params)
+            completed = full.complete_missing_data(attendance_data)
+            full.build_calendar(completed, holidays, employee_leave_periods)
+            return full.calculate_statistics(completed), full.calculate_late_penalties(completed)
+        (stats, penalties), full_time = _timed(full_analysis)
+
+        stats = analyzer.expand(stats).sort_values(['Name', 'Date'], kind='stable').reset_index(drop=True)
+        penalties = penalties.sort_values(['Name', 'Year', 'Week'], kind='stable').reset_index(drop=True)
+        _same_frame(history.statistics()[stats.columns], stats)
+        _same_frame(history.penalties()[penalties.columns], penalties)
+
+    # Dernier export : transformation comprise, comme l'analyse complète
+    _, transform_time = _timed(analyzer.transform_punches, export.copy())
+    print(f"mise à jour incrémentale ({len(export)} pointages, {result['days']} employés-jours "
+          f"recalculés sur {len(stats)}) : {transform_time + elapsed:.3f}s, "
+          f"analyse complète {full_time:.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure des performances de PresenceAnalyzer")
+    parser.add_argument('--employees', type=int, default=200)
+    parser.add_argument('--days', type=int, default=120)
+    parser.add_argument('--export', help="Export badgeuse réel pour comparer les moteurs de lecture")
+    args = parser.parse_args()
+
+    raw = generate_punches(args.employees, args.days)
+    print(f"{len(raw)} pointages, {args.employees} employés, {args.days} jours")
+    bench_transform(raw)
+    bench_statistics(raw)
+    bench_memory(raw)
+    bench_report(raw)
+    bench_readers(raw, args.export)
+    bench_incremental(raw)
+
+
+if __name__ == "__main__":
+    main()
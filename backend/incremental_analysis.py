@@ -0,0 +1,349 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from analysis_cache import canonical_params, write_atomic
+from analysis_pipeline import configure_analyzer
+from presence_analyzer import PresenceAnalyzer
+from report_writer import REPORT_TABLES_FILE, export_report, save_report_tables
+
+# État de l'historique (période, employés, compteurs d'absences, jours de repos appliqués)
+STATE_FILE = 'etat.json'
+KEYS = ['Name', 'Date']
+DAILY_COLUMNS = ['C/In', 'C/Out', 'pause_duration']
+# Tables du rapport de l'historique, régénérées à la première demande après une mise à jour
+HISTORY_REPORT_DIR = 'rapport'
+
+
+def week_of(days):
+    """Lundi de la semaine ISO de chaque jour (ordinaux de jour, 1970-01-01 étant un jeudi)"""
+    return days - (days + 3) % 7
+
+
+def month_of(days):
+    """Mois de chaque jour (année * 12 + mois - 1), fenêtre de détection des jours de repos"""
+    dates = pd.to_datetime(np.asarray(days, dtype='int64'), unit='D')
+    return np.asarray(dates.year * 12 + dates.month - 1)
+
+
+def month_bounds(month):
+    """Premier et dernier jour (ordinaux) d'un mois de month_of"""
+    start = pd.Timestamp(year=month // 12, month=month % 12 + 1, day=1)
+    end = start + pd.offsets.MonthEnd(0)
+    return (start - pd.Timestamp(0)).days, (end - pd.Timestamp(0)).days
+
+
+class IncrementalAnalysis:
+    """Statistiques d'un historique de pointages, mises à jour export par export
+
+    L'historique est conservé dans directory, une partition par semaine ISO : présence
+    journalière (mode compact), statistiques et pénalités hebdomadaires. Un nouvel export
+    ne recalcule que les employés-jours dont les pointages ont changé, ainsi que les
+    pénalités des semaines qui les contiennent.
+
+    Les jours de repos sont détectés mois par mois, comme l'analyse d'un export mensuel,
+    grâce aux compteurs d'absences par mois et par jour de semaine. Les jours de repos de
+    chaque mois sont conservés : seuls les mois touchés par l'export sont réexaminés, et
+    seules les journées d'un mois dont la détection change sont recalculées. Le coût d'une
+    mise à jour dépend donc de l'export et non de l'historique. Les statistiques sont
+    celles d'analyses mois par mois : elles ne sont identiques à celles d'une analyse
+    complète de l'historique que si les jours de repos sont saisis (restDays).
+
+    Si les paramètres d'analyse changent, les statistiques sont recalculées à partir de la
+    présence journalière conservée, sans relire les exports.
+    """
+
+    def __init__(self, directory, analysis_params):
+        self.directory = directory
+        self.analysis_params = analysis_params
+        self.params = canonical_params(analysis_params)
+        os.makedirs(directory, exist_ok=True)
+
+        state = {}
+        state_path = os.path.join(directory, STATE_FILE)
+        if os.path.exists(state_path):
+            with open(state_path, encoding='utf-8') as f:
+                state = json.load(f)
+        self.first_day = state.get('first_day')  # Période couverte (ordinaux de jour)
+        self.last_day = state.get('last_day')
+        self.employees = state.get('employees', [])
+        self.weeks = set(state.get('weeks', []))
+        # Mois -> employé -> absences par jour de semaine (lundi = 0)
+        self.absences = state.get('absences', {})
+        self.rest_days = state.get('rest_days', {})  # Mois -> employé -> jours de repos appliqués
+        # Paramètres différents de ceux des statistiques conservées : tout est à recalculer
+        self.stale = state.get('params', self.params) != self.params
+
+    def _partition_path(self, week):
+        return os.path.join(self.directory, f"semaine_{week}.pkl")
+
+    def _load(self, week):
+        if week not in self.weeks:
+            return {'daily': None, 'stats': None, 'penalties': None}
+        return pd.read_pickle(self._partition_path(week))
+
+    def _save(self, week, partition):
+        write_atomic(self._partition_path(week), lambda path: pd.to_pickle(partition, path))
+        self.weeks.add(week)
+
+    def _save_state(self):
+        state = {
+            'params': self.params,
+            'first_day': self.first_day,
+            'last_day': self.last_day,
+            'employees': self.employees,
+            'weeks': sorted(self.weeks),
+            'absences': self.absences,
+            'rest_days': self.rest_days
+        }
+
+        def write(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+        write_atomic(os.path.join(self.directory, STATE_FILE), write)
+
+    def _working_days(self, analyzer, start, end):
+        days = np.arange(start, end + 1, dtype='int32')
+        return days[np.isin((days + 3) % 7, analyzer.working_days)]
+
+    def _candidates(self, analyzer, attendance_data):
+        """Employés-jours que l'export peut modifier, avec leur présence d'après l'export
+
+        Comme une analyse complète de l'historique et de l'export réunis : tous les employés
+        sur tous les jours de l'export (absents compris), les jours ouvrables entre l'ancienne
+        période et l'export, et les jours déjà conservés pour les nouveaux employés.
+        """
+        low, high = int(attendance_data['Date'].min()), int(attendance_data['Date'].max())
+        names = attendance_data['Name'].astype(object)
+        known = set(self.employees)
+        newcomers = [name for name in names.unique() if name not in known]
+        employees = self.employees + newcomers
+
+        if self.first_day is None:
+            old_days = np.array([], dtype='int32')
+            days = self._working_days(analyzer, low, high)
+        else:
+            all_days = self._working_days(analyzer, min(low, self.first_day), max(high, self.last_day))
+            in_export = (all_days >= low) & (all_days <= high)
+            in_history = (all_days >= self.first_day) & (all_days <= self.last_day)
+            days = all_days[in_export | ~in_history]
+            old_days = all_days[in_history & ~in_export]
+
+        grid = [pd.MultiIndex.from_product([employees, days], names=KEYS).to_frame(index=False)]
+        if newcomers and len(old_days):
+            grid.append(pd.MultiIndex.from_product([newcomers, old_days], names=KEYS).to_frame(index=False))
+        grid = pd.concat(grid, ignore_index=True)
+        grid['Date'] = grid['Date'].astype('int32')
+
+        daily = attendance_data.assign(Name=names)[KEYS + DAILY_COLUMNS]
+        candidates = grid.merge(daily, on=KEYS, how='left')
+        for col in DAILY_COLUMNS:
+            candidates[col] = candidates[col].astype('Int32')
+        self.employees = employees
+        self.first_day = low if self.first_day is None else min(low, self.first_day)
+        self.last_day = high if self.last_day is None else max(high, self.last_day)
+        return candidates
+
+    def _count_absences(self, rows, sign):
+        absent = rows[rows['C/In'].isna() & rows['C/Out'].isna()]
+        days = absent['Date'].to_numpy()
+        weekdays = (days + 3) % 7
+        counts = pd.Series(weekdays).groupby([month_of(days), absent['Name'].to_numpy(), weekdays]).size()
+        for (month, name, weekday), count in counts.items():
+            month_counts = self.absences.setdefault(str(month), {})
+            month_counts.setdefault(name, [0] * 7)[weekday] += sign * int(count)
+
+    def _detected_rest_days(self, analyzer, month, min_absences=3):
+        """detect_rest_days sur un mois de l'historique, d'après les compteurs d'absences"""
+        counts = self.absences.get(str(month), {})
+        detected = {}
+        for employee in self.employees:
+            days = [weekday for weekday, count in enumerate(counts.get(employee, [0] * 7))
+                    if count >= min_absences]
+            detected[employee] = days or analyzer.default_rest_days()
+        return detected
+
+    def update(self, attendance_data):
+        """Intègre un export (présence journalière compacte de transform_raw_data)
+
+        Les jours de l'export remplacent ceux de l'historique. Renvoie le nombre
+        d'employés-jours et de semaines recalculés.
+        """
+        analyzer = PresenceAnalyzer()
+        analyzer.compact = True
+        candidates = self._candidates(analyzer, attendance_data)
+        candidates['Week'] = week_of(candidates['Date'].to_numpy())
+
+        # Employés-jours absents de l'historique ou dont la présence a changé
+        partitions = {}
+        changed = []
+        for week, rows in candidates.groupby('Week', sort=False):
+            week = int(week)
+            rows = rows.drop(columns='Week')
+            partition = self._load(week)
+            old = partition['daily']
+            if old is None:
+                modified = rows
+                kept = rows.iloc[:0]
+            else:
+                merged = rows.merge(old, on=KEYS, how='left', suffixes=('', '_old'), indicator=True)
+                same = (merged['_merge'] == 'both').to_numpy()
+                for col in DAILY_COLUMNS:
+                    new, previous = merged[col], merged[f"{col}_old"]
+                    same = same & ((new == previous).fillna(False) | (new.isna() & previous.isna())).to_numpy()
+                modified = rows[~same]
+                previous = merged.loc[~same & (merged['_merge'] == 'both').to_numpy(),
+                                      KEYS + [f"{col}_old" for col in DAILY_COLUMNS]]
+                self._count_absences(previous.set_axis(KEYS + DAILY_COLUMNS, axis=1), -1)
+                keys = pd.MultiIndex.from_frame(rows[KEYS])
+                kept = old[~pd.MultiIndex.from_frame(old[KEYS]).isin(keys)]
+            self._count_absences(modified, 1)
+            if len(modified):
+                partition['daily'] = pd.concat([kept, rows], ignore_index=True)
+                partitions[week] = partition
+                changed.append(modified)
+        touched = list(partitions)
+
+        # Jours de repos des mois dont les absences ont changé (de tous les mois si les
+        # paramètres d'analyse ont changé) ; la saisie du client remplace la détection
+        analyzer, holidays, employee_leave_periods = configure_analyzer(
+            None, self.analysis_params, detected_rest_days={}
+        )
+        entered = dict(analyzer.employee_rest_days)
+        if self.stale:
+            months = np.unique(month_of(np.arange(self.first_day, self.last_day + 1)))
+        else:
+            months = np.unique(np.concatenate([month_of(rows['Date'].to_numpy()) for rows in changed]
+                                              or [np.array([], dtype='int64')]))
+        rest_days, rest_changed = {}, {}
+        for month in months.tolist():
+            detected = self._detected_rest_days(analyzer, month)
+            rest_days[month] = {employee: list(days) for employee, days in {**detected, **entered}.items()}
+            previous = self.rest_days.get(str(month), {})
+            employees = {employee for employee in self.employees
+                         if rest_days[month].get(employee) != previous.get(employee)}
+            if employees:
+                rest_changed[month] = employees
+
+        # Journées à recalculer : modifiées, ou celles du mois d'un employé dont les jours de
+        # repos de ce mois changent (toutes si les paramètres d'analyse ont changé)
+        if self.stale:
+            for week in self.weeks - set(partitions):
+                partitions[week] = self._load(week)
+            changed = [partition['daily'] for partition in partitions.values()]
+        else:
+            for month, employees in rest_changed.items():
+                first, last = month_bounds(month)
+                for week in range(int(week_of(first)), last + 1, 7):
+                    if week not in partitions and week in self.weeks:
+                        partitions[week] = self._load(week)
+                    if week not in partitions:
+                        continue
+                    daily = partitions[week]['daily']
+                    changed.append(daily[daily['Name'].isin(employees)
+                                         & (daily['Date'] >= first) & (daily['Date'] <= last)])
+
+        if not changed:
+            self._save_state()
+            return {"days": 0, "weeks": 0}
+
+        # Statistiques mois par mois, chacun avec ses jours de repos
+        changed = pd.concat(changed, ignore_index=True).drop_duplicates(KEYS)
+        stats = []
+        for month, rows in changed.groupby(month_of(changed['Date'].to_numpy()), sort=False):
+            analyzer.employee_rest_days = dict(rest_days[int(month)])
+            completed = analyzer.complete_missing_data(rows)
+            analyzer.build_calendar(completed, holidays, employee_leave_periods)
+            stats.append(analyzer.calculate_statistics(completed))
+        stats = pd.concat(stats, ignore_index=True)
+        stats['Week'] = week_of(stats['Date'].to_numpy())
+
+        # Pénalités hebdomadaires des semaines dont la présence a changé (elles ne dépendent
+        # que des heures d'entrée)
+        penalties_by_week = {}
+        if touched:
+            week_rows = pd.concat([partitions[week]['daily'] for week in touched], ignore_index=True)
+            penalties = analyzer.calculate_late_penalties(analyzer.complete_missing_data(week_rows))
+            monday = pd.to_datetime(
+                penalties['Year'].astype(str) + '-W' + penalties['Week'].astype(str).str.zfill(2) + '-1',
+                format='%G-W%V-%u'
+            )
+            weeks = (monday - pd.Timestamp(0)).dt.days.to_numpy()
+            penalties_by_week = {int(week): rows for week, rows in penalties.groupby(weeks, sort=False)}
+            empty_penalties = penalties.iloc[:0]
+
+        stats_by_week = {int(week): rows for week, rows in stats.groupby('Week', sort=False)}
+        for week, partition in partitions.items():
+            new_stats = stats_by_week.get(week)
+            old_stats = partition['stats']
+            if new_stats is not None:
+                new_stats = new_stats.drop(columns='Week')
+                if old_stats is not None:
+                    keys = pd.MultiIndex.from_frame(new_stats[KEYS])
+                    old_stats = old_stats[~pd.MultiIndex.from_frame(old_stats[KEYS]).isin(keys)]
+                partition['stats'] = pd.concat([old_stats, new_stats], ignore_index=True)
+            if week in touched:
+                partition['penalties'] = penalties_by_week.get(week, empty_penalties)
+            self._save(week, partition)
+
+        self.rest_days.update({str(month): days for month, days in rest_days.items()})
+        self.stale = False
+        self._save_state()
+        return {"days": len(changed), "weeks": len(partitions)}
+
+    def _collect(self, table):
+        parts = [self._load(week)[table] for week in sorted(self.weeks)]
+        parts = [part for part in parts if part is not None]
+        if not parts:
+            return pd.DataFrame()
+        return pd.concat(parts, ignore_index=True)
+
+    def statistics(self):
+        """Statistiques journalières de tout l'historique, triées par employé et par date"""
+        stats = self._collect('stats')
+        if stats.empty:
+            return stats
+        stats = stats.sort_values(KEYS, kind='stable').reset_index(drop=True)
+        return PresenceAnalyzer().expand(stats)
+
+    def penalties(self):
+        """Pénalités de retard hebdomadaires (calculate_late_penalties) de tout l'historique"""
+        penalties = self._collect('penalties')
+        if penalties.empty:
+            return penalties
+        return penalties.sort_values(['Name', 'Year', 'Week'], kind='stable').reset_index(drop=True)
+
+
+def update_history(directory, attendance_data, analysis_params):
+    """Intègre un export dans l'historique de directory (IncrementalAnalysis.update)
+
+    Le rapport de l'historique est effacé, pour être régénéré à la prochaine demande.
+    Renvoie le nombre d'employés-jours et de semaines recalculés, et la période couverte.
+    """
+    history = IncrementalAnalysis(directory, analysis_params)
+    result = history.update(attendance_data)
+    shutil.rmtree(os.path.join(directory, HISTORY_REPORT_DIR), ignore_errors=True)
+    first_day, last_day = (pd.Timestamp(0) + pd.to_timedelta([history.first_day, history.last_day], unit='D'))
+    return {
+        **result,
+        "employees": len(history.employees),
+        "date_range": {"start": first_day.strftime('%Y-%m-%d'), "end": last_day.strftime('%Y-%m-%d')}
+    }
+
+
+def export_history(directory, export_format, table='Statistiques_Detaillees'):
+    """Fichier du rapport de l'historique (statistiques journalières et pénalités), comme
+    export_report ; les tables sont lues dans les partitions à la première demande
+    """
+    report_dir = os.path.join(directory, HISTORY_REPORT_DIR)
+    if not os.path.exists(os.path.join(report_dir, REPORT_TABLES_FILE)):
+        # Lecture seule : les paramètres d'analyse ne servent qu'aux mises à jour
+        history = IncrementalAnalysis(directory, {})
+        save_report_tables({
+            'Statistiques_Detaillees': history.statistics(),
+            'Penalites_Hebdomadaires': history.penalties()
+        }, report_dir)
+    return export_report(report_dir, export_format, table)
@@ -1,10 +1,28 @@
-from fastapi import FastAPI, UploadFile, HTTPException, Form
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from fastapi.responses import FileResponse, StreamingResponse
 import pandas as pd
-from presence_analyzer import PresenceAnalyzer
-import tempfile
+from analysis_cache import ParsedUploadCache, AnalysisResultCache, analysis_key
+from analysis_pipeline import (
+    parse_export, detect_employees, analyze_upload, read_report, report_session, write_modified_report,
+    write_edited_report, write_report, report_stage, employee_batch_stats, totals_from_sums, TOTAL_COLUMNS
+)
+from analysis_jobs import JobQueue
+from modification_log import ModificationLog
+from analysis_sessions import SessionStore
+from report_writer import EXPORT_FORMATS, export_report
+from presence_analyzer import CHUNKED_EXTENSIONS
+from incremental_analysis import STATE_FILE, export_history, update_history
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import hashlib
 import os
+import shutil
+import tempfile
+import time
 from datetime import datetime, timedelta
 import json
 import uuid
@@ -20,6 +38,61 @@ TEMP_DIR = "temp_reports"
 if not os.path.exists(TEMP_DIR):
     os.makedirs(TEMP_DIR)
 
+# Cache des exports déjà transformés, partagé par /employees et /upload
+parsed_uploads = ParsedUploadCache(
+    max_entries=int(os.environ.get("PARSE_CACHE_MAX_ENTRIES", 16)),
+    max_bytes=int(os.environ.get("PARSE_CACHE_MAX_BYTES", 512 * 2**20))
+)
+
+# Résultats d'analyse déjà calculés (fichier + paramètres), conservés sur disque
+analysis_results = AnalysisResultCache(
+    os.path.join(TEMP_DIR, "resultats"),
+    max_entries=int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", 64)),
+    max_memory_entries=int(os.environ.get("RESULT_CACHE_MEMORY_ENTRIES", 8))
+)
+
+# Pointages normalisés des exports importés (Arrow), relus sans reparser le classeur ;
+# supprimés au démarrage s'ils n'ont pas servi depuis PUNCH_CACHE_MAX_AGE secondes
+PUNCH_CACHE_DIR = os.path.join(TEMP_DIR, "pointages")
+PUNCH_CACHE_MAX_AGE = int(os.environ.get("PUNCH_CACHE_MAX_AGE", 7 * 24 * 3600))
+
+# Historique des modifications (journal en ajout seul indexé par employé), conservé
+# entre deux démarrages
+modification_history = ModificationLog(os.path.join(TEMP_DIR, "modifications"))
+
+# Historiques de pointages par site, mis à jour export par export (analyse incrémentale) ;
+# conservés hors de TEMP_DIR, vidé au démarrage
+HISTORY_DIR = os.environ.get("HISTORY_DIR", "historiques")
+history_locks = {}  # Site -> asyncio.Lock : une mise à jour ou un export à la fois par historique
+
+# Données des rapports en cours d'édition, gardées côté serveur
+analysis_sessions = SessionStore(
+    max_sessions=int(os.environ.get("ANALYSIS_SESSIONS_MAX", 32)),
+    ttl=int(os.environ.get("ANALYSIS_SESSION_TTL_SECONDS", 3600))
+)
+
+# Nombre de processus pour l'analyse et l'écriture des rapports (0 : un thread par requête)
+ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", os.cpu_count() or 1))
+analysis_pool = None
+
+# Taille maximale des groupes d'employés envoyés par /upload/stream (le premier groupe
+# ne contient qu'un employé, puis la taille double jusqu'à cette limite)
+STREAM_MAX_BATCH_EMPLOYEES = int(os.environ.get("STREAM_MAX_BATCH_EMPLOYEES", 32))
+
+# Tâches d'analyse en arrière-plan (/jobs), suivies par le client jusqu'à leur fin
+analysis_jobs = JobQueue(
+    max_running=max(ANALYSIS_WORKERS, 1),
+    ttl=int(os.environ.get("JOB_TTL_SECONDS", 3600)),
+    shared_stages=ANALYSIS_WORKERS > 0
+)
+
+# Réception des fichiers : copie sur disque par blocs, taille maximale configurable
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 256 * 2**20))
+UPLOAD_CHUNK_SIZE = 2**20
+# Signatures d'un classeur .xls (OLE2) et .xlsx (archive zip)
+EXCEL_SIGNATURES = (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', b'PK\x03\x04')
+# Exports badgeuse acceptés : classeurs Excel et journaux texte (lus par morceaux)
+PUNCH_EXTENSIONS = ('.xls', '.xlsx') + CHUNKED_EXTENSIONS
 
 
 class Modification(BaseModel):
@@ -52,295 +125,522 @@ app.add_middleware(
 # Supprimez la route @app.options("/import-report") car elle n'est plus nécessaire
 
 
-def format_timedelta(td):
-    if pd.isnull(td) or td == timedelta(0):
-        return "00:00"
-    total_seconds = int(td.total_seconds())
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    return f"{hours:02d}:{minutes:02d}"
-
-def calculate_detailed_stats(stats_df):
-    """Calcule les statistiques détaillées"""
-    # Conversion des données quotidiennes en format JSON pour le frontend
-    daily_stats = []
-    for _, row in stats_df.iterrows():
-        daily_stats.append({
-            'Date': row['Date'].strftime('%Y-%m-%d') if isinstance(row['Date'], (datetime, pd.Timestamp)) else row['Date'],
-            'Name': row['Name'],
-            'Retard': row['Retard'],
-            'Depart_Anticipe': row['Depart_Anticipe'],
-            'Heures_Sup_50': row['Heures_Sup_50'],
-            'Heures_Sup_100': row['Heures_Sup_100'],
-            'Pause_Effective': row['Pause_Effective'],
-            'Temps_Travail': row['Temps_Travail'],
-            'Penalites': row['Penalites']
-        })
-    
-    total_stats = {
-        # Statistiques totales
-        "total_retards": format_timedelta(stats_df['Retard'].sum()),
-        "total_heures_sup_50": format_timedelta(stats_df['Heures_Sup_50'].sum()),
-        "total_heures_sup_100": format_timedelta(stats_df['Heures_Sup_100'].sum()),
-        "total_temps_travail": format_timedelta(stats_df['Temps_Travail'].sum()),
-        "moyenne_temps_travail": format_timedelta(stats_df['Temps_Travail'].mean()),
-        "stats_par_employe": [],
-        "daily_records": daily_stats  # Ajout des données quotidiennes
-    }
-    
-    # Statistiques par employé
-    for name, group in stats_df.groupby('Name'):
-        employee_stats = {
-            "nom": name,
-            "retards": format_timedelta(group['Retard'].sum()),
-            "heures_sup": format_timedelta(group['Heures_Sup_50'].sum() + group['Heures_Sup_100'].sum()),
-            "temps_travail": format_timedelta(group['Temps_Travail'].sum()),
-            "jours_travailles": len(group[group['Temps_Travail'] > timedelta(0)])
-        }
-        total_stats["stats_par_employe"].append(employee_stats)
+@app.middleware("http")
+async def reject_oversized_requests(request: Request, call_next):
+    """Refuse une requête trop grosse d'après son en-tête, avant d'en lire le corps"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES:
+        return JSONResponse(status_code=413, content={"detail": "Fichier trop volumineux"})
+    return await call_next(request)
 
-    return total_stats
 
-@app.post("/employees")
-async def get_employees(file: UploadFile):
+def get_analysis_pool():
+    """Pool de processus de l'analyse, créé au premier usage"""
+    global analysis_pool
+    if analysis_pool is None:
+        analysis_pool = ProcessPoolExecutor(max_workers=ANALYSIS_WORKERS)
+    return analysis_pool
+
+async def run_cpu_bound(func, *args):
+    """Exécute func hors de la boucle d'événements (pool de processus, ou thread si ANALYSIS_WORKERS=0)"""
+    global analysis_pool
+    loop = asyncio.get_running_loop()
+    executor = get_analysis_pool() if ANALYSIS_WORKERS > 0 else None
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_path = temp_file.name
+        return await loop.run_in_executor(executor, func, *args)
+    except BrokenProcessPool:
+        # Un processus est mort (mémoire, signal) : le pool est recréé à la prochaine requête
+        analysis_pool = None
+        raise
+
+class UploadReceiver:
+    """Callbacks du parseur multipart : le fichier est écrit sur disque au fil de la réception
+
+    Extension, taille et signature sont vérifiées pendant la réception du corps de la
+    requête : un fichier refusé l'est dès l'en-tête de sa partie ou le bloc fautif, sans
+    copie intermédiaire. Les autres champs (params) sont gardés en mémoire.
+    """
+
+    def __init__(self, extensions):
+        self.extensions = extensions
+        self.fields = {}
+        self.filename = None
+        self.path = None
+        self.size = 0
+        self.hasher = hashlib.sha256()
+        self._file = None
+        self._head = bytearray()
+
+    def callbacks(self):
+        return {
+            'on_part_begin': self.on_part_begin,
+            'on_header_field': self.on_header_field,
+            'on_header_value': self.on_header_value,
+            'on_header_end': self.on_header_end,
+            'on_headers_finished': self.on_headers_finished,
+            'on_part_data': self.on_part_data,
+            'on_part_end': self.on_part_end,
+        }
 
-        analyzer = PresenceAnalyzer()
-        attendance_data = analyzer.transform_raw_data(temp_path)
-        employees = attendance_data['Name'].unique().tolist()
+    def on_part_begin(self):
+        self._header_field, self._header_value = b'', b''
+        self._disposition = b''
+        self._name, self._data, self._in_file = None, bytearray(), False
+
+    def on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_field.lower() == b'content-disposition':
+            self._disposition = self._header_value
+        self._header_field, self._header_value = b'', b''
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        self._name = options.get(b'name', b'').decode('utf-8', 'replace')
+        if b'filename' not in options:
+            return
+        if self.path is not None:
+            raise HTTPException(status_code=400, detail="Un seul fichier par requête")
+        self.filename = options[b'filename'].decode('utf-8', 'replace')
+        if not self.filename.lower().endswith(self.extensions):
+            raise HTTPException(status_code=400, detail="Format de fichier non supporté")
+        self._file = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(self.filename)[1])
+        self.path = self._file.name
+        self._in_file = True
+
+    def on_part_data(self, data, start, end):
+        chunk = data[start:end]
+        if not self._in_file:
+            if len(self._data) + len(chunk) > UPLOAD_CHUNK_SIZE:
+                raise HTTPException(status_code=413, detail=f"Champ {self._name} trop volumineux")
+            self._data += chunk
+            return
+        self.size += len(chunk)
+        if self.size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Fichier trop volumineux")
+        # Premier bloc gardé pour reconnaître un binaire inconnu dès qu'il est complet
+        if len(self._head) < UPLOAD_CHUNK_SIZE:
+            self._head += chunk[:UPLOAD_CHUNK_SIZE - len(self._head)]
+            if len(self._head) == UPLOAD_CHUNK_SIZE:
+                self.check_head()
+        self.hasher.update(chunk)
+        self._file.write(chunk)
+
+    def on_part_end(self):
+        if not self._in_file:
+            self.fields[self._name] = self._data.decode('utf-8')
+            return
+        self._file.close()
+        if self.size == 0:
+            raise HTTPException(status_code=400, detail="Fichier vide")
+        if len(self._head) < UPLOAD_CHUNK_SIZE:
+            self.check_head()
+
+    def check_head(self):
+        # Le format réel est détecté à la lecture : seul un binaire inconnu est refusé ici
+        if not self._head.startswith(EXCEL_SIGNATURES) and b'\0' in self._head:
+            raise HTTPException(status_code=400, detail="Le fichier n'est ni un classeur Excel ni un journal texte")
+
+    def field(self, name):
+        if name not in self.fields:
+            raise HTTPException(status_code=422, detail=f"Champ de formulaire manquant : {name}")
+        return self.fields[name]
+
+    @property
+    def digest(self):
+        return self.hasher.hexdigest()
+
+    def discard(self):
+        if self._file is not None:
+            self._file.close()
+            os.unlink(self.path)
+
+
+async def receive_upload(request, extensions):
+    """Reçoit un formulaire multipart avec un fichier, écrit sur disque par blocs au fil de l'eau
+
+    Le corps est lu directement depuis request.stream() : la mémoire utilisée ne dépend pas
+    de la taille du fichier, qui n'est écrit qu'une fois. Renvoie l'UploadReceiver (path,
+    digest SHA-256, filename, field()) ; l'appelant supprime le fichier path.
+    """
+    content_type, options = parse_options_header(request.headers.get('content-type', ''))
+    if content_type != b'multipart/form-data' or b'boundary' not in options:
+        raise HTTPException(status_code=400, detail="Formulaire multipart attendu")
+
+    receiver = UploadReceiver(extensions)
+    parser = MultipartParser(options[b'boundary'], receiver.callbacks())
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+        if receiver.path is None:
+            raise HTTPException(status_code=400, detail="Aucun fichier reçu")
+    except FormParserError as e:
+        receiver.discard()
+        raise HTTPException(status_code=400, detail=f"Formulaire invalide: {str(e)}")
+    except BaseException:
+        receiver.discard()
+        raise
+    return receiver
+
+async def parse_upload(path, digest):
+    """Transforme un export badgeuse, sans le relire s'il est déjà dans le cache"""
+    attendance_data = parsed_uploads.get(digest)
+    if attendance_data is None:
+        attendance_data = await run_cpu_bound(parse_export, path, digest, PUNCH_CACHE_DIR)
+        parsed_uploads.put(digest, attendance_data)
+    return attendance_data
+
+
+async def run_analysis(upload_path, digest, analysis_params, filename, progress=None):
+    """Analyse d'un export copié sur disque (supprimé ensuite), en passant par les caches
+
+    Partagée par /upload et les tâches de /jobs/upload ; progress reçoit le nom de chaque étape.
+    """
+    try:
+        # Même fichier et mêmes paramètres : rapport et statistiques déjà calculés
+        result_key = analysis_key(digest, analysis_params)
+        cached_response = analysis_results.get(result_key)
+        if cached_response is not None:
+            cached_response["filename"] = filename
+            return cached_response
+
+        # Transformation des données (cache partagé avec /employees)
+        report_stage(progress, 'parse')
+        attendance_data = await parse_upload(upload_path, digest)
+    finally:
+        os.unlink(upload_path)
+
+    # Analyse et tables du rapport (identifiant = clé du résultat en cache)
+    report_dir = os.path.join(TEMP_DIR, f"rapport_{result_key}")
+    response = await run_cpu_bound(
+        analyze_upload, attendance_data, analysis_params, result_key, report_dir, progress
+    )
+    response["filename"] = filename
+    analysis_results.put(result_key, response, files=[report_dir])
+    return response
 
-        os.unlink(temp_path)
+@app.post("/employees")
+async def get_employees(request: Request):
+    try:
+        upload = await receive_upload(request, PUNCH_EXTENSIONS)
+        try:
+            attendance_data = await parse_upload(upload.path, upload.digest)
+        finally:
+            os.unlink(upload.path)
+        employees, rest_days = await run_cpu_bound(detect_employees, attendance_data)
         
-        return {"employees": employees}
+        return {
+            "employees": employees,
+            # Jours de repos détectés, pour pré-remplir le formulaire
+            "restDays": [
+                {"employeeName": employee, "days": days}
+                for employee, days in rest_days.items()
+            ]
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/upload")
-async def upload_file(file: UploadFile, params: str = Form(...)):
+async def upload_file(request: Request):
     try:
-        analysis_params = json.loads(params)
-        
-        if not file.filename.endswith(('.xls', '.xlsx')):
-            raise HTTPException(status_code=400, detail="Format de fichier non supporté")
+        upload = await receive_upload(request, PUNCH_EXTENSIONS)
+        try:
+            analysis_params = json.loads(upload.field("params"))
+        except BaseException:
+            os.unlink(upload.path)
+            raise
+        return await run_analysis(upload.path, upload.digest, analysis_params, upload.filename)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur serveur: {str(e)}")
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_path = temp_file.name
+def sse_event(event, data):
+    """Message server-sent events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-            
+@app.post("/upload/stream")
+async def upload_stream(request: Request):
+    """Statistiques envoyées employé par employé (server-sent events), puis le rapport
+
+    Événements : start (liste des employés), employee (entrée stats_par_employe et
+    pointages journaliers de l'employé), totals, report (réponse de /upload sans
+    detailed_stats, déjà envoyées), ou error si l'analyse échoue en cours de route.
+    Le rapport est écrit à partir des résultats des groupes d'employés, sans nouvelle
+    analyse, et mis en cache comme celui de /upload.
+    """
+    try:
+        upload = await receive_upload(request, PUNCH_EXTENSIONS)
+        digest = upload.digest
+        try:
+            analysis_params = json.loads(upload.field("params"))
+            result_key = analysis_key(digest, analysis_params)
+            cached_response = analysis_results.get(result_key)
+            attendance_data = None
+            if cached_response is None:
+                attendance_data = await parse_upload(upload.path, digest)
+        finally:
+            os.unlink(upload.path)
 
-        analyzer = PresenceAnalyzer()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur serveur: {str(e)}")
 
-        contract_ends = analysis_params.get('contractEnds', {})
-        for employee, end_date in contract_ends.items():
-            if end_date:
-                analyzer.set_contract_end(employee, end_date)
+    def report_event(response):
+        response["filename"] = upload.filename
+        return sse_event("report", {key: value for key, value in response.items() if key != "detailed_stats"})
+
+    async def replay(response):
+        # Même fichier et mêmes paramètres : résultat en cache renvoyé sous forme d'événements
+        detailed_stats = response["detailed_stats"]
+        employees = [entry["nom"] for entry in detailed_stats["stats_par_employe"]]
+        yield sse_event("start", {"employees": employees})
+        daily_records = {}
+        for record in detailed_stats["daily_records"]:
+            daily_records.setdefault(record["Name"], []).append(record)
+        for done, entry in enumerate(detailed_stats["stats_par_employe"], start=1):
+            yield sse_event("employee", {
+                "stats": entry,
+                "daily_records": daily_records.get(entry["nom"], []),
+                "progress": {"done": done, "total": len(employees)}
+            })
+        yield sse_event("totals", {key: value for key, value in detailed_stats.items()
+                                   if key not in ("stats_par_employe", "daily_records")})
+        yield report_event(response)
+
+    async def events():
+        employees = sorted(attendance_data['Name'].unique().tolist())
+        yield sse_event("start", {"employees": employees})
+
+        sums = {"days": 0, **{col: timedelta(0) for col in TOTAL_COLUMNS}}
+        results, stats_par_employe, all_daily_records = [], [], []
+        done, batch_size = 0, 1
         try:
-            # Transformation des données
-            attendance_data = analyzer.transform_raw_data(temp_path)
-            
-            # Configuration des jours de repos
-            for rest_day_config in analysis_params.get('restDays', []):
-                employee = rest_day_config['employeeName']
-                days = rest_day_config['days']
-                analyzer.employee_rest_days[employee] = days
-            
-            # Complétion des données
-            completed_data = analyzer.complete_missing_data(attendance_data)
-            
-            # Conversion des dates de congés
-            holidays = [datetime.strptime(h['date'], '%Y-%m-%d').date() 
-                       for h in analysis_params.get('holidays', [])]
-            
-            # Préparation des périodes de congés
-            employee_leave_periods = {}
-            for leave in analysis_params.get('leavePeriods', []):
-                employee = leave['employeeName']
-                start = datetime.strptime(leave['startDate'], '%Y-%m-%d').date()
-                end = datetime.strptime(leave['endDate'], '%Y-%m-%d').date()
-                leave_type = leave.get('leaveType', 'Congé annuel')
-                if employee not in employee_leave_periods:
-                    employee_leave_periods[employee] = []
-            
-                employee_leave_periods[employee].append((start, end, leave_type))
+            while done < len(employees):
+                batch = employees[done:done + batch_size]
+                subset = attendance_data[attendance_data['Name'].isin(batch)]
+                if isinstance(subset['Name'].dtype, pd.CategoricalDtype):
+                    subset = subset.assign(Name=subset['Name'].cat.remove_unused_categories())
+
+                detailed, batch_sums, batch_results = await run_cpu_bound(
+                    employee_batch_stats, subset, analysis_params
+                )
+                for key in sums:
+                    sums[key] += batch_sums[key]
+                results.append(batch_results)
+                stats_par_employe.extend(detailed["stats_par_employe"])
+                all_daily_records.extend(detailed["daily_records"])
+
+                daily_records = {}
+                for record in detailed["daily_records"]:
+                    daily_records.setdefault(record["Name"], []).append(record)
+                for entry in detailed["stats_par_employe"]:
+                    done += 1
+                    yield sse_event("employee", {
+                        "stats": entry,
+                        "daily_records": daily_records.get(entry["nom"], []),
+                        "progress": {"done": done, "total": len(employees)}
+                    })
+                batch_size = min(batch_size * 2, STREAM_MAX_BATCH_EMPLOYEES)
 
-            # Calcul des statistiques complètes
-            stats = analyzer.calculate_statistics(completed_data)
+            totals = totals_from_sums(sums)
+            yield sse_event("totals", totals)
 
-            # Fonction pour vérifier les jours de repos
-            def is_rest_day(row, employee_rest_days):
-                weekday = pd.to_datetime(row['Date']).dayofweek
-                return weekday in employee_rest_days.get(row['Name'], [4, 5])
-            
-            # Calcul des absences en excluant les jours de repos
-            absences = stats[
-                (stats['Temps_Travail'] == timedelta(0)) & 
-                (~stats.apply(lambda row: is_rest_day(row, analyzer.employee_rest_days), axis=1))
-            ]
-            
-            net_absences, net_absences_total = analyzer.calculate_net_absences(
-                absences, holidays, employee_leave_periods
+            # Rapport et absences à partir des résultats des groupes (identifiant = clé du cache)
+            report_dir = os.path.join(TEMP_DIR, f"rapport_{result_key}")
+            detailed_stats = {**totals, "stats_par_employe": stats_par_employe, "daily_records": all_daily_records}
+            response = await run_cpu_bound(
+                write_report, results, analysis_params, result_key, report_dir, detailed_stats
             )
+            response["filename"] = upload.filename
+            analysis_results.put(result_key, response, files=[report_dir])
+            yield report_event(response)
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Erreur serveur: {str(e)}"})
 
-            # Génération du rapport Excel
-            report_id = str(uuid.uuid4())
-            report_path = os.path.join(TEMP_DIR, f"rapport_{report_id}.xlsx")
-            
-            with pd.ExcelWriter(report_path) as writer:
-                # Détails journaliers
-                detailed_stats = stats.copy()
-                for col in ['Retard', 'Depart_Anticipe', 'Heures_Sup_50', 'Heures_Sup_100', 
-                           'Pause_Effective', 'Temps_Travail', 'Penalites']:
-                    detailed_stats[col] = detailed_stats[col].apply(format_timedelta)
-                detailed_stats.to_excel(writer, 'Statistiques_Detaillees', index=False)
-
-                # Statistiques par employé
-                employee_stats = stats.groupby('Name').agg({
-                    'Retard': 'sum',
-                    'Depart_Anticipe': 'sum',
-                    'Heures_Sup_50': 'sum',
-                    'Heures_Sup_100': 'sum',
-                    'Pause_Effective': 'sum',
-                    'Temps_Travail': 'sum',
-                    'Penalites': 'sum'
-                }).reset_index()
-                
-                for col in employee_stats.columns:
-                    if col != 'Name':
-                        employee_stats[col] = employee_stats[col].apply(format_timedelta)
-                
-                employee_stats.to_excel(writer, 'Statistiques_Par_Employe', index=False)
-                
-                # Autres onglets
-                net_absences.to_excel(writer, 'Absences_Nettes', index=False)
-                net_absences_total.to_excel(writer, 'Total_Absences', index=False)
-                pd.DataFrame({'Jours_Feries': holidays}).to_excel(writer, 'Jours_Feries', index=False)
-                
-                # Congés
-                leave_data = []
-                for emp, periods in employee_leave_periods.items():
-                    for start, end, leave_type in periods:
-                        nb_jours = (end - start).days + 1
-                        leave_data.append({
-                            'Employe': emp,
-                            'Debut': start.strftime('%Y-%m-%d'),
-                            'Fin': end.strftime('%Y-%m-%d'),
-                            'Type': leave_type,
-                            'Nombre_Jours': nb_jours
-                        })
-                pd.DataFrame(leave_data).to_excel(writer, 'Conges', index=False)
-
-            # Calcul des statistiques pour l'interface web
-            detailed_stats = calculate_detailed_stats(stats)
-
-            absences_data = net_absences[['Name', 'Date']].to_dict('records')
-            for absence in absences_data:
-                if isinstance(absence['Date'], (datetime, pd.Timestamp)):
-                    absence['Date'] = absence['Date'].strftime('%Y-%m-%d')
-
-            # Calcul des statistiques pour l'interface web
-            detailed_stats = calculate_detailed_stats(stats)
-
-            # Préparation des données de congés
-            leave_data = []
-            for emp, periods in employee_leave_periods.items():
-                for start, end, leave_type in periods:
-                    leave_data.append({
-                        'Employe': emp,
-                        'Debut': start.strftime('%Y-%m-%d'),
-                        'Fin': end.strftime('%Y-%m-%d'),
-                        'Type': leave_type,
-                        'Nombre_Jours': (end - start).days + 1
-                    })
-
-            return {
-                "status": "success",
-                "filename": file.filename,
-                "report_id": report_id,
-                "analysis": {
-                    "total_records": len(completed_data),
-                    "employees": completed_data['Name'].nunique(),
-                    "date_range": {
-                        "start": completed_data['Date'].min().strftime('%Y-%m-%d'),
-                        "end": completed_data['Date'].max().strftime('%Y-%m-%d')
-                    }
-                },
-                "detailed_stats": detailed_stats,
-                "conges": leave_data,
-                "absences": net_absences[['Name', 'Date']].to_dict('records'),
-                "message": "Fichier analysé avec succès"
-            }
+    return StreamingResponse(
+        replay(cached_response) if cached_response is not None else events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-        finally:
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+@app.post("/jobs/upload", status_code=202)
+async def submit_upload_job(request: Request):
+    """Lance l'analyse en arrière-plan et renvoie aussitôt l'identifiant de la tâche"""
+    try:
+        # Le fichier est écrit sur disque pendant la requête ; la tâche le supprime une fois lu
+        upload = await receive_upload(request, PUNCH_EXTENSIONS)
+        try:
+            analysis_params = json.loads(upload.field("params"))
+        except BaseException:
+            os.unlink(upload.path)
+            raise
+        upload_path, digest, filename = upload.path, upload.digest, upload.filename
+        job = analysis_jobs.submit(
+            lambda progress: run_analysis(upload_path, digest, analysis_params, filename, progress)
+        )
+        return {"job_id": job.id, "status": job.status}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur serveur: {str(e)}")
 
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Étape et avancement d'une tâche ; contient la réponse de /upload une fois terminée"""
+    status = analysis_jobs.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Tâche non trouvée")
+    return status
+
 @app.get("/download/{report_id}")
 async def download_report(report_id: str):
-    report_path = os.path.join(TEMP_DIR, f"rapport_{report_id}.xlsx")
-    if not os.path.exists(report_path):
+    return await download_report_export(report_id, "xlsx")
+
+@app.get("/download/{report_id}/{export_format}")
+async def download_report_export(report_id: str, export_format: str, table: str = "Statistiques_Detaillees"):
+    """Rapport au format xlsx, csv (zip de toutes les tables), parquet ou arrow (table demandée)
+
+    Chaque fichier est généré à la première demande à partir des tables enregistrées par
+    /upload ; dans les exports csv, parquet et arrow les durées sont en secondes.
+    """
+    report_dir = os.path.join(TEMP_DIR, f"rapport_{report_id}")
+    if not os.path.isdir(report_dir):
         raise HTTPException(status_code=404, detail="Rapport non trouvé")
-    
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=404, detail=f"Format inconnu : {export_format}")
+
+    return await export_response(export_report, report_dir, export_format, table)
+
+async def export_response(export, directory, export_format, table):
+    """Fichier généré par export (export_report ou export_history) pour le téléchargement"""
+    try:
+        report_path = await run_cpu_bound(export, directory, export_format, table)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Table inconnue : {table}")
+    except ImportError as e:
+        raise HTTPException(status_code=501, detail=f"Format {export_format} indisponible : {str(e)}")
+
+    media_type = EXPORT_FORMATS[export_format][1]
+    extension = os.path.basename(report_path).split('.', 1)[1]
+    suffix = "" if export_format in ("xlsx", "csv") else f"_{table}"
     return FileResponse(
         report_path,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        filename=f"rapport_presence_{datetime.now().strftime('%Y%m%d')}.xlsx"
+        media_type=media_type,
+        filename=f"rapport_presence_{datetime.now().strftime('%Y%m%d')}{suffix}.{extension}"
     )
 
+def history_dir(site):
+    if not site.replace('-', '').replace('_', '').isalnum():
+        raise HTTPException(status_code=400, detail="Nom de site invalide")
+    return os.path.join(HISTORY_DIR, site)
+
+@app.post("/history/{site}")
+async def update_site_history(site: str, request: Request):
+    """Intègre l'export mensuel d'un site dans son historique
+
+    Seuls les employés-jours dont les pointages ont changé (et les semaines de pénalités
+    qui les contiennent) sont recalculés : le coût dépend de l'export, pas de l'historique.
+    Les jours de repos sont détectés mois par mois, sauf saisie du client (restDays).
+    """
+    directory = history_dir(site)
+    try:
+        upload = await receive_upload(request, PUNCH_EXTENSIONS)
+        try:
+            analysis_params = json.loads(upload.field("params"))
+            attendance_data = await parse_upload(upload.path, upload.digest)
+        finally:
+            os.unlink(upload.path)
+
+        async with history_locks.setdefault(site, asyncio.Lock()):
+            result = await run_cpu_bound(update_history, directory, attendance_data, analysis_params)
+        return {"status": "success", "site": site, **result}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur serveur: {str(e)}")
+
+@app.get("/history/{site}/download/{export_format}")
+async def download_site_history(site: str, export_format: str, table: str = "Statistiques_Detaillees"):
+    """Statistiques journalières et pénalités de tout l'historique d'un site, dans les
+    formats de /download/{report_id}/{export_format}
+    """
+    directory = history_dir(site)
+    if not os.path.exists(os.path.join(directory, STATE_FILE)):
+        raise HTTPException(status_code=404, detail="Historique non trouvé")
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=404, detail=f"Format inconnu : {export_format}")
+
+    async with history_locks.setdefault(site, asyncio.Lock()):
+        return await export_response(export_history, directory, export_format, table)
+
 @app.on_event("startup")
 async def cleanup_old_reports():
     if os.path.exists(TEMP_DIR):
+        # Les rapports encore référencés par le cache de résultats sont conservés
+        cached_reports = {f"rapport_{key}" for key in analysis_results.keys()}
         for file in os.listdir(TEMP_DIR):
             file_path = os.path.join(TEMP_DIR, file)
             if os.path.isfile(file_path):
                 os.unlink(file_path)
+            elif file.startswith("rapport_") and file not in cached_reports:
+                shutil.rmtree(file_path)
+
+    if os.path.exists(PUNCH_CACHE_DIR):
+        for file in os.listdir(PUNCH_CACHE_DIR):
+            file_path = os.path.join(PUNCH_CACHE_DIR, file)
+            if time.time() - os.path.getmtime(file_path) > PUNCH_CACHE_MAX_AGE:
+                os.unlink(file_path)
+
+
+@app.on_event("shutdown")
+async def shutdown_analysis_pool():
+    await analysis_jobs.shutdown()
+    if analysis_pool is not None:
+        analysis_pool.shutdown()
 
 
 @app.post("/import-report")
-async def import_report(file: UploadFile):
+async def import_report(request: Request):
     """Importe et analyse le rapport Excel existant"""
     try:
-        if not file.filename.endswith('.xlsx'):
-            raise HTTPException(status_code=400, detail="Le fichier doit être au format .xlsx")
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_path = temp_file.name
+        upload = await receive_upload(request, ('.xlsx',))
+        upload_path = upload.path
 
         try:
-            # Lire le fichier Excel
-            stats_df = pd.read_excel(temp_path, sheet_name='Statistiques_Detaillees')
-            
-            # Obtenir la liste des employés
-            employees = stats_df['Name'].unique().tolist()
-            
-            # Convertir les données en format JSON
-            data = stats_df.to_dict('records')
-            
+            # Lire le fichier Excel : liste des employés et données au format JSON,
+            # gardées aussi en session pour les rapports modifiés
+            employees, data, report = await run_cpu_bound(read_report, upload_path)
+            session = analysis_sessions.create(report)
+
             return {
                 "status": "success",
                 "message": "Rapport importé avec succès",
                 "data": data,
                 "employees": employees,
-                "total_records": len(data)
+                "total_records": len(data),
+                "session_id": session.id
             }
 
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Erreur lors de la lecture du fichier: {str(e)}")
-        
+
         finally:
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+            os.unlink(upload_path)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur serveur: {str(e)}")                
 
@@ -349,33 +649,18 @@ async def import_report(file: UploadFile):
 async def save_modifications(request: ModificationRequest):
     """Sauvegarde les modifications avec historique"""
     try:
-        # Créer le fichier d'historique s'il n'existe pas
-        history_file = os.path.join(TEMP_DIR, "modifications_history.json")
-        
-        # Charger l'historique existant
-        if os.path.exists(history_file):
-            with open(history_file, 'r') as f:
-                history = json.load(f)
-        else:
-            history = []
-
-        # Ajouter les nouvelles modifications avec timestamp
+        # Ajouter les nouvelles modifications avec timestamp (ajout en fin de journal)
         new_entry = {
             "timestamp": datetime.now().isoformat(),
             "employee": request.employee,
             "modifications": [mod.dict() for mod in request.modifications]
         }
-        
-        history.append(new_entry)
-
-        # Sauvegarder l'historique mis à jour
-        with open(history_file, 'w') as f:
-            json.dump(history, f, indent=2)
+        modification_id = modification_history.append(new_entry)
 
         return {
             "status": "success",
             "message": "Modifications sauvegardées",
-            "modification_id": len(history) - 1  # Index pour pouvoir annuler
+            "modification_id": modification_id  # Index pour pouvoir annuler
         }
 
     except Exception as e:
@@ -389,21 +674,8 @@ async def save_modifications(request: ModificationRequest):
 async def get_modifications_history(employee: str):
     """Récupère l'historique des modifications pour un employé"""
     try:
-        history_file = os.path.join(TEMP_DIR, "modifications_history.json")
-        
-        if not os.path.exists(history_file):
-            return {"modifications": []}
-
-        with open(history_file, 'r') as f:
-            history = json.load(f)
-
-        # Filtrer l'historique pour l'employé spécifique
-        employee_history = [
-            entry for entry in history 
-            if entry["employee"] == employee
-        ]
-
-        return {"modifications": employee_history}
+        # Seules les entrées de l'employé sont lues (index par employé)
+        return {"modifications": modification_history.for_employee(employee)}
 
     except Exception as e:
         raise HTTPException(
@@ -412,46 +684,66 @@ async def get_modifications_history(employee: str):
         )
 
 class ReportGenerationRequest(BaseModel):
-    original_data: List[dict]
+    original_data: Optional[List[dict]] = None  # Données complètes, sans session
+    session_id: Optional[str] = None  # Session côté serveur : seules les modifications sont envoyées
     modifications: List[dict]
     employee: str
 
+
+def get_session(session_id):
+    """Session d'édition ouverte par /import-report ou /edit-report"""
+    session = analysis_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session inconnue ou expirée")
+    return session
+
+
+@app.post("/edit-report/{report_id}")
+async def edit_report(report_id: str):
+    """Ouvre une session d'édition sur le rapport d'une analyse (report_id de /upload)
+
+    Le report_id désigne un résultat partagé en cache : la session reçoit son propre
+    identifiant et sa propre copie des statistiques journalières.
+    """
+    report_dir = os.path.join(TEMP_DIR, f"rapport_{report_id}")
+    if not report_id.isalnum() or not os.path.isdir(report_dir):
+        raise HTTPException(status_code=404, detail="Rapport non trouvé")
+
+    try:
+        report = await run_cpu_bound(report_session, report_dir)
+        session = analysis_sessions.create(report)
+        return {"status": "success", "session_id": session.id}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de l'ouverture du rapport: {str(e)}")
+
+
 @app.post("/generate-modified-report")
 async def generate_modified_report(request: ReportGenerationRequest):
     """Génère un nouveau rapport Excel avec les modifications"""
     try:
-        # Convertir les données originales en DataFrame
-        df = pd.DataFrame(request.original_data)
-        
-        # Appliquer les modifications
-        for mod in request.modifications:
-            mask = (df['Name'] == request.employee) & (df['Date'] == mod['date'])
-            df.loc[mask, mod['field']] = mod['new_value']
-
         # Créer un nouveau rapport
         report_id = str(uuid.uuid4())
         report_path = os.path.join(TEMP_DIR, f"rapport_modifie_{report_id}.xlsx")
-        
-        with pd.ExcelWriter(report_path) as writer:
-            # Données modifiées
-            df.to_excel(writer, 'Statistiques_Detaillees', index=False)
-            
-            # Historique des modifications
-            history_df = pd.DataFrame(request.modifications)
-            history_df['employee'] = request.employee
-            history_df['timestamp'] = datetime.now().isoformat()
-            history_df.to_excel(writer, 'Historique_Modifications', index=False)
-
-            # Calcul des nouvelles statistiques
-            employee_stats = df[df['Name'] == request.employee].agg({
-                'Retard': 'sum',
-                'Heures_Sup_50': 'sum',
-                'Heures_Sup_100': 'sum',
-                'Temps_Travail': 'sum',
-                'Penalites': 'sum'
-            }).to_frame().transpose()
-            
-            employee_stats.to_excel(writer, 'Resume_Modifications', index=False)
+
+        if request.session_id is not None:
+            # Modifications appliquées aux données gardées en session (index employé-date),
+            # puis écriture du rapport hors de la boucle d'événements
+            session = get_session(request.session_id)
+            async with session.lock:
+                session.report.apply(request.employee, request.modifications)
+                await run_cpu_bound(
+                    write_edited_report,
+                    session.report, request.modifications, request.employee, report_path
+                )
+        elif request.original_data is not None:
+            # Application des modifications et écriture du rapport hors de la boucle d'événements
+            await run_cpu_bound(
+                write_modified_report,
+                request.original_data, request.modifications, request.employee, report_path
+            )
+        else:
+            raise HTTPException(status_code=400, detail="session_id ou original_data requis")
 
         return {
             "status": "success",
@@ -460,6 +752,8 @@ async def generate_modified_report(request: ReportGenerationRequest):
             "file_path": report_path
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -489,6 +783,15 @@ async def download_modified_report(report_id: str):
         )        
     
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Compteurs de succès / échecs des caches d'analyse"""
+    return {
+        "parsed_uploads": parsed_uploads.stats(),
+        "analysis_results": analysis_results.stats(),
+        "analysis_sessions": analysis_sessions.stats()
+    }
+
 @app.get("/test")
 async def test():
     return {"message": "Server is running"}    
@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+
+try:
+    import fcntl  # Verrou entre processus (serveur lancé avec plusieurs workers)
+except ImportError:
+    fcntl = None
+
+LOG_FILE = 'modifications.ndjson'
+INDEX_FILE = 'modifications.idx'
+
+
+class ModificationLog:
+    """Historique des modifications en ajout seul, indexé par employé
+
+    Chaque sauvegarde ajoute une ligne JSON au journal et une ligne [employé, position,
+    longueur] à l'index, sans relire ni réécrire l'existant. L'index est gardé en mémoire
+    et complété par les lignes ajoutées entre-temps par d'autres processus : une lecture
+    ne touche que les entrées de l'employé demandé. Les ajouts concurrents sont sérialisés
+    par un verrou (fcntl entre processus, et un verrou de thread dans le processus).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.log_path = os.path.join(directory, LOG_FILE)
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self._entries = {}  # employé -> [(position, longueur), ...] dans le journal
+        self._count = 0
+        self._index_size = 0  # Partie de l'index déjà chargée
+        self._lock = threading.Lock()
+        with self._locked():
+            self._repair()
+
+    def _locked(self):
+        return _FileLock(self._lock, os.path.join(self.directory, '.verrou'))
+
+    def _refresh(self):
+        """Charge les lignes d'index ajoutées depuis la dernière lecture"""
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'rb') as f:
+            f.seek(self._index_size)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Ligne en cours d'écriture par un autre processus
+                employee, offset, length = json.loads(line)
+                self._entries.setdefault(employee, []).append((offset, length))
+                self._count += 1
+                self._index_size += len(line)
+
+    def _repair(self):
+        """Indexe les entrées du journal absentes de l'index (arrêt entre les deux écritures)"""
+        self._refresh()
+        if not os.path.exists(self.log_path):
+            return
+        indexed_end = max((offset + length for entries in self._entries.values()
+                           for offset, length in entries), default=0)
+        with open(self.log_path, 'rb') as f:
+            f.seek(indexed_end)
+            offset = indexed_end
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                self._write_index(json.loads(line)['employee'], offset, len(line))
+                offset += len(line)
+
+    def _write_index(self, employee, offset, length):
+        line = (json.dumps([employee, offset, length], ensure_ascii=False) + '\n').encode('utf-8')
+        _append(self.index_path, line)
+        self._entries.setdefault(employee, []).append((offset, length))
+        self._count += 1
+        self._index_size += len(line)
+
+    def append(self, entry):
+        """Ajoute une entrée (dict avec une clé employee) ; renvoie son numéro d'ordre"""
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._locked():
+            self._refresh()
+            offset = _append(self.log_path, line)
+            modification_id = self._count
+            self._write_index(entry['employee'], offset, len(line))
+        return modification_id
+
+    def for_employee(self, employee):
+        """Entrées d'un employé, dans l'ordre des sauvegardes"""
+        with self._lock:
+            self._refresh()
+            positions = list(self._entries.get(employee, []))
+        if not positions:
+            return []
+        entries = []
+        with open(self.log_path, 'rb') as f:
+            for offset, length in positions:
+                f.seek(offset)
+                entries.append(json.loads(f.read(length)))
+        return entries
+
+
+def _append(path, data):
+    """Ajoute data en fin de fichier en une seule écriture ; renvoie sa position"""
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        offset = os.lseek(fd, 0, os.SEEK_END)
+        os.write(fd, data)
+        return offset
+    finally:
+        os.close(fd)
+
+
+class _FileLock:
+    """Verrou de thread, doublé d'un verrou fcntl sur un fichier quand il est disponible"""
+
+    def __init__(self, lock, path):
+        self.lock = lock
+        self.path = path
+        self.fd = None
+
+    def __enter__(self):
+        self.lock.acquire()
+        if fcntl is not None:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+        self.lock.release()
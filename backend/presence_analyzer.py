@@ -1,8 +1,26 @@
 import pandas as pd
+import numpy as np
 import os
 from datetime import datetime, time, timedelta
 from collections import defaultdict
 from enum import Enum
+from pandas.api.types import union_categoricals
+from time_kernel import column_seconds, span, to_seconds, to_timedelta
+from report_writer import ReportWriter, DURATION_COLUMNS
+from spreadsheet_readers import detect_format, read_spreadsheet
+from punch_cache import file_hash, load_punches, punch_cache_path, save_punches
+
+# Colonnes utiles d'un journal de pointages
+PUNCH_COLUMNS = ['Name', 'Date/Time', 'Status']
+# Journaux texte lus par morceaux
+CHUNKED_EXTENSIONS = ('.csv', '.ndjson', '.jsonl')
+
+def to_dates(values):
+    """Convertit des dates (date, Timestamp ou ordinal de jour du mode compact) en datetime64"""
+    values = pd.Series(values)
+    if pd.api.types.is_integer_dtype(values):
+        return pd.to_datetime(values.astype('int64'), unit='D')
+    return pd.to_datetime(values)
 
 class LeaveType(str, Enum):
     ANNUAL = "Congé annuel"
@@ -14,6 +32,118 @@ class LeaveType(str, Enum):
     def get_all_types(cls):
         return [cls.ANNUAL, cls.SICK, cls.EXCEPTIONAL, cls.UNPAID, cls.PARENTAL]
 
+class LeaveIndex:
+    """Index des périodes de congés de tous les employés, trié par date de début"""
+
+    def __init__(self, employee_leave_periods):
+        leaves = pd.DataFrame(
+            [(employee, start, end, leave_type)
+             for employee, periods in employee_leave_periods.items()
+             for start, end, leave_type in periods],
+            columns=['Name', 'Debut', 'Fin', 'Type_Conge']
+        )
+        leaves['Debut'] = pd.to_datetime(leaves['Debut'])
+        leaves['Fin'] = pd.to_datetime(leaves['Fin'])
+        leaves = leaves.sort_values('Debut', kind='stable').reset_index(drop=True)
+
+        # Périodes qui se chevauchent : on garde la fin la plus tardive parmi les congés
+        # déjà commencés, avec le type du congé qui la porte
+        covered_until = leaves.groupby('Name')['Fin'].cummax()
+        leaves['Type_Conge'] = (leaves['Type_Conge'].where(leaves['Fin'] == covered_until)
+                                .groupby(leaves['Name']).ffill())
+        leaves['Fin'] = covered_until
+        self.leaves = leaves
+
+    def lookup(self, names, dates):
+        """Type de congé couvrant chaque couple (employé, date), NaN si aucun"""
+        if self.leaves.empty:
+            return pd.Series(float('nan'), index=names.index, dtype=object)
+
+        query = pd.DataFrame({'Name': np.asarray(names, dtype=object), 'Date': to_dates(dates).to_numpy()})
+        query = query.sort_values('Date', kind='stable')
+        matched = pd.merge_asof(
+            query.reset_index(), self.leaves.astype({'Name': query['Name'].dtype}),
+            left_on='Date', right_on='Debut', by='Name'
+        ).set_index('index').sort_index()
+        leave_types = matched['Type_Conge'].where(matched['Date'] <= matched['Fin'])
+        return pd.Series(leave_types.to_numpy(), index=names.index, dtype=object)
+
+class AttendanceCalendar:
+    """Matrice employé × date du statut de chaque jour, construite une fois par analyse"""
+
+    # Bits de statut ; les bits de poids fort portent le type de congé (0 = aucun)
+    REST = 1
+    HOLIDAY = 2
+    INACTIVE = 4
+    LEAVE_SHIFT = 3
+
+    def __init__(self, employees, start, end, rest_days, default_rest_days,
+                 holidays=(), employee_leave_periods=None, contracts=None):
+        self.employees = pd.Index(pd.unique(np.asarray(employees, dtype=object)))
+        if pd.isnull(start):
+            self.dates = pd.DatetimeIndex([])
+        else:
+            self.dates = pd.date_range(start, end, freq='D', normalize=True)
+
+        # Configuration figée, pour savoir si la matrice est encore à jour
+        self.rest_days = dict(rest_days)
+        self.holidays = set(holidays)
+        self.employee_leave_periods = dict(employee_leave_periods or {})
+        self.contracts = dict(contracts or {})
+
+        matrix = np.zeros((len(self.employees), len(self.dates)), dtype=np.uint8)
+
+        # Jours de repos : table employé × jour de semaine projetée sur les dates
+        weekly = np.zeros((len(self.employees), 7), dtype=bool)
+        for i, name in enumerate(self.employees):
+            weekly[i, list(self.rest_days.get(name, default_rest_days))] = True
+        matrix |= weekly[:, self.dates.dayofweek] * np.uint8(self.REST)
+
+        matrix[:, self.dates.isin(pd.to_datetime(list(self.holidays)))] |= self.HOLIDAY
+
+        # Après la fin de contrat
+        ends = pd.to_datetime(pd.Series(self.employees).map(self.contracts)).to_numpy()
+        matrix |= (self.dates.to_numpy()[None, :] > ends[:, None]) * np.uint8(self.INACTIVE)
+
+        # Congés : même règle de chevauchement que LeaveIndex
+        self.leave_types = list(LeaveType.get_all_types())
+        leave_index = LeaveIndex(self.employee_leave_periods)
+        on_leave = self.employees.isin(leave_index.leaves['Name'])
+        if on_leave.any():
+            rows = np.repeat(np.flatnonzero(on_leave), len(self.dates))
+            names = pd.Series(self.employees[rows])
+            types = leave_index.lookup(names, np.tile(self.dates.to_numpy(), on_leave.sum()))
+            for leave_type in types.dropna().unique():
+                if leave_type not in self.leave_types:
+                    self.leave_types.append(leave_type)
+            codes = types.map({t: i + 1 for i, t in enumerate(self.leave_types)}).fillna(0).to_numpy()
+            matrix[rows, np.tile(np.arange(len(self.dates)), on_leave.sum())] |= (
+                codes.astype(np.uint8) << self.LEAVE_SHIFT
+            )
+        self.matrix = matrix
+
+    def covers(self, names, dates):
+        """Vérifie que tous les couples (employé, date) sont dans la matrice"""
+        dates = to_dates(dates)
+        return (bool(names.isin(self.employees).all()) and
+                (dates.empty or (dates.min() >= self.dates[0] and dates.max() <= self.dates[-1])))
+
+    def status(self, names, dates):
+        """Statut de chaque couple (employé, date), lu directement dans la matrice"""
+        if names.empty:
+            return pd.Series(np.zeros(0, dtype=np.uint8), index=names.index)
+        rows = self.employees.get_indexer(names)
+        cols = (to_dates(pd.Series(dates, index=names.index)) - self.dates[0]).dt.days.to_numpy()
+        return pd.Series(self.matrix[rows, cols], index=names.index)
+
+    def is_rest_day(self, names, dates):
+        return (self.status(names, dates) & self.REST) != 0
+
+    def leave_type(self, status):
+        """Type de congé porté par une colonne de statuts, NaN si aucun"""
+        labels = pd.Series([float('nan')] + self.leave_types, dtype=object)
+        return pd.Series(labels.to_numpy()[status.to_numpy() >> self.LEAVE_SHIFT], index=status.index)
+
 class PresenceAnalyzer:
     def __init__(self):
         # Configuration des jours de travail
@@ -53,9 +183,24 @@ class PresenceAnalyzer:
         self.employee_rest_days = {}  # Jours repos par employé
         self.contracts = {}  # Pour gérer les fins de contrat
 
+        # Moteur de calcul (True = opérations colonne, False = ancien apply ligne à ligne)
+        self.vectorized = True
+        self.calendar = None  # Statuts employé × date de l'analyse en cours
+        # Représentation compacte (noms catégoriels, ordinaux de jour, heures en secondes) ;
+        # nécessite le moteur colonne
+        self.compact = False
+        self.chunk_size = 200_000  # Lignes par morceau pour les journaux CSV / NDJSON
+        self.reader_backend = None  # Moteur de lecture des classeurs (None : le plus rapide installé)
+        self.punch_cache = False  # Conserve les pointages normalisés (Arrow) pour les analyses suivantes
+        self.punch_cache_dir = None  # Répertoire de ce cache (None : à côté du fichier source)
+
     def _calculate_daily_balance(self, entry_time, exit_time):
-        """Nouvelle méthode pour calculer le bilan journalier"""
-        if pd.isnull(entry_time) or pd.isnull(exit_time):
+        """Nouvelle méthode pour calculer le bilan journalier
+
+        Une sortie antérieure à l'entrée (pointages inversés) est laissée hors du bilan,
+        comme une journée sans pointage ; la ligne est signalée par Pointages_Inverses.
+        """
+        if pd.isnull(entry_time) or pd.isnull(exit_time) or self._is_reversed(entry_time, exit_time):
             return {
                 'retard': timedelta(0),
                 'heures_sup_50': timedelta(0),
@@ -103,6 +248,12 @@ class PresenceAnalyzer:
             }    
 
 
+    def _is_reversed(self, entry_time, exit_time):
+        """Sortie pointée avant l'entrée"""
+        if pd.isnull(entry_time) or pd.isnull(exit_time):
+            return False
+        return to_seconds(exit_time) < to_seconds(entry_time)
+
     def set_contract_end(self, employee, end_date):
         """Définit la date de fin de contrat"""
         self.contracts[employee] = datetime.strptime(end_date, '%Y-%m-%d').date()
@@ -113,6 +264,28 @@ class PresenceAnalyzer:
             return date.date() <= self.contracts[employee]
         return True    
 
+    def build_calendar(self, df, holidays=(), employee_leave_periods=None):
+        """Construit le calendrier des statuts pour les employés et la période de df"""
+        dates = to_dates(df['Date'])
+        self.calendar = AttendanceCalendar(
+            df['Name'], dates.min(), dates.max(),
+            self.employee_rest_days, self.default_rest_days(),
+            holidays, employee_leave_periods, self.contracts
+        )
+        return self.calendar
+
+    def _calendar_for(self, df, holidays=None, employee_leave_periods=None):
+        """Calendrier courant s'il correspond à la configuration, sinon reconstruit"""
+        calendar = self.calendar
+        if (calendar is None or not calendar.covers(df['Name'], df['Date'])
+                or calendar.rest_days != self.employee_rest_days
+                or calendar.contracts != self.contracts
+                or (holidays is not None and calendar.holidays != set(holidays))
+                or (employee_leave_periods is not None
+                    and calendar.employee_leave_periods != employee_leave_periods)):
+            calendar = self.build_calendar(df, holidays or (), employee_leave_periods)
+        return calendar
+
     def detect_and_manage_rest_days(self, df, employee_name):
         """Détecte et gère les jours de repos pour un employé"""
         print(f"\nAnalyse des jours de repos pour {employee_name}...")
@@ -161,6 +334,20 @@ class PresenceAnalyzer:
         else:
             return self.default_rest_days()
 
+    def detect_rest_days(self, df, min_absences=3):
+        """Détecte en une seule passe groupée les jours de repos de tous les employés"""
+        absent = df[pd.isnull(df['C/In']) & pd.isnull(df['C/Out'])]
+        weekday = to_dates(absent['Date']).dt.dayofweek.rename('Weekday')
+        absence_counts = weekday.groupby([absent['Name'], weekday], observed=True).size()
+
+        # Jours avec 3 absences ou plus, sinon jours par défaut
+        frequent = absence_counts[absence_counts >= min_absences].reset_index(name='Absences')
+        detected = frequent.groupby('Name', observed=True)['Weekday'].agg(lambda days: sorted(days.tolist()))
+        return {
+            employee: detected.get(employee, self.default_rest_days())
+            for employee in df['Name'].unique()
+        }
+
     def default_rest_days(self):
         """Retourne les jours de repos par défaut"""
         return [4, 5]  # Vendredi, Samedi
@@ -191,38 +378,259 @@ class PresenceAnalyzer:
         
         return sorted(rest_days)    
 
-    def transform_raw_data(self, input_file):
-        """Transform raw attendance data from XLS file"""
+    def transform_raw_data(self, input_file, digest=None):
+        """Transform raw attendance data from XLS file
+
+        Avec punch_cache, les pointages normalisés sont relus depuis le cache Arrow tant que
+        l'empreinte du fichier ne change pas (digest : empreinte SHA-256 déjà calculée).
+        """
         print("1. Transformation des données brutes...")
-        
-        # Charger les données
-        data = pd.read_excel(input_file, engine='xlrd')
+
+        if not self.punch_cache:
+            return self._daily_attendance(self.read_punches(input_file))
+
+        fingerprint = {
+            'source': digest or file_hash(input_file),
+            'compact': self.compact,
+            'working_days': list(self.working_days)
+        }
+        cache_path = punch_cache_path(input_file, fingerprint['source'], self.punch_cache_dir)
+        punches = load_punches(cache_path, fingerprint)
+        if punches is None:
+            punches = self.read_punches(input_file)
+            save_punches(cache_path, punches, fingerprint)
+        return self._daily_attendance(punches)
+
+    def read_punches(self, input_file):
+        """Pointages normalisés (Name, Date/Time, Status, Date, Time, Day) des jours ouvrables
+
+        Pour les journaux texte, seuls les pointages retenus par _reduce_punches sont renvoyés.
+        """
+        # Format détecté sur le contenu : l'extension du fichier importé peut être fausse
+        file_format = detect_format(input_file)
+
+        # Journaux texte (CSV, NDJSON) : lecture par morceaux
+        if file_format in ('csv', 'ndjson'):
+            return self.parse_punch_chunks(self.read_punch_chunks(input_file, file_format))
+
+        # Charger les données (colonnes utiles seulement)
+        data = read_spreadsheet(input_file, usecols=PUNCH_COLUMNS, backend=self.reader_backend)
+        return self._parse_punches(data)
+
+    def read_punch_chunks(self, input_file, file_format='csv'):
+        """Lit un journal CSV ou NDJSON par morceaux de chunk_size lignes (colonnes utiles seulement)"""
+        if file_format == 'csv':
+            with open(input_file, encoding='utf-8-sig') as f:
+                header = f.readline()
+            # Séparateur le plus fréquent de la ligne d'en-tête
+            separator = max([',', ';', '\t'], key=header.count)
+            with pd.read_csv(input_file, sep=separator, usecols=PUNCH_COLUMNS, dtype=str,
+                             encoding='utf-8-sig', chunksize=self.chunk_size) as reader:
+                yield from reader
+        else:
+            with pd.read_json(input_file, lines=True, dtype=False, convert_dates=False,
+                              chunksize=self.chunk_size) as reader:
+                for chunk in reader:
+                    yield chunk[PUNCH_COLUMNS]
+
+    def parse_punch_chunks(self, chunks):
+        """_parse_punches pour un journal lu par morceaux
+
+        Chaque morceau est daté, filtré sur les jours ouvrables puis fusionné aux pointages déjà
+        réduits avant le suivant : la mémoire dépend de chunk_size et du nombre d'employés-jours,
+        pas de la taille du journal.
+        """
+        reduced = None
+        for chunk in chunks:
+            part = self._parse_punches(chunk)
+            if len(part):
+                reduced = self._reduce_punches(part if reduced is None else self._concat_punches([reduced, part]))
+        if reduced is None:
+            raise ValueError("Aucun pointage sur un jour ouvrable dans le fichier")
+        return reduced
+
+    def _reduce_punches(self, data):
+        """Ne garde que les pointages utiles à _daily_attendance, au plus cinq par employé-jour
+
+        Les deux premiers C/In (entrée, fin de pause), les deux premiers et le dernier C/Out
+        (début de pause, sortie), plus la première ligne de chaque journée et de chaque employé
+        pour conserver les jours pointés et l'ordre d'apparition des employés. Réduire la
+        réunion de deux réductions donne la réduction de la réunion : les morceaux se
+        fusionnent sans changer le résultat.
+        """
+        # Tri par employé, jour, statut puis horodatage, sur des codes entiers
+        names = pd.factorize(data['Name'], use_na_sentinel=False)[0]
+        days = pd.factorize(data['Date'])[0]
+        statuses = pd.factorize(data['Status'], use_na_sentinel=False)[0]
+        order = np.lexsort((data['Date/Time'].to_numpy(), statuses, days, names))
+        first_rows = np.unique(names, return_index=True)[1]
+        names, days, statuses = names[order], days[order], statuses[order]
+
+        # Rang de chaque pointage dans sa journée pour son statut
+        new_day = np.r_[True, (names[1:] != names[:-1]) | (days[1:] != days[:-1])]
+        new_group = new_day | np.r_[True, statuses[1:] != statuses[:-1]]
+        positions = np.arange(len(order))
+        rank = positions - np.maximum.accumulate(np.where(new_group, positions, 0))
+        last = np.r_[new_group[1:], True]
+
+        status = data['Status'].to_numpy()[order]
+        entry, exit_ = status == 'C/In', status == 'C/Out'
+        kept = np.zeros(len(data), dtype=bool)
+        kept[order] = ((entry | exit_) & (rank < 2)) | (exit_ & last) | new_day
+        kept[first_rows] = True
+        return data[kept]
+
+    def _concat_punches(self, parts):
+        """Concaténation sans repasser par des objets (catégories fusionnées)"""
+        columns = {}
+        for col in parts[0].columns:
+            if isinstance(parts[0][col].dtype, pd.CategoricalDtype):
+                columns[col] = union_categoricals([part[col] for part in parts])
+            else:
+                columns[col] = np.concatenate([part[col].to_numpy() for part in parts])
+        return pd.DataFrame(columns)
+
+    def transform_punches(self, data):
+        """Transforme un journal de pointages (Name, Date/Time, Status) en présence journalière"""
+        return self._daily_attendance(self._parse_punches(data))
+
+    def _parse_punches(self, data):
+        """Date et heure de chaque pointage, limité aux jours ouvrables"""
+        data = data[PUNCH_COLUMNS].copy()
         data['Date/Time'] = pd.to_datetime(data['Date/Time'], format='%d/%m/%Y %H:%M:%S')
         
         # Extraire date et heure
-        data['Date'] = data['Date/Time'].dt.date
-        data['Time'] = data['Date/Time'].dt.time
+        if self.compact:
+            # Ordinal de jour et secondes depuis minuit, sans objets Python
+            day = data['Date/Time'].dt.normalize()
+            data['Name'] = data['Name'].astype('category')
+            data['Status'] = data['Status'].astype('category')
+            data['Date'] = (day - pd.Timestamp(0)).dt.days.astype('int32')
+            data['Time'] = ((data['Date/Time'] - day) // pd.Timedelta(seconds=1)).astype('int32')
+        else:
+            data['Date'] = data['Date/Time'].dt.date
+            data['Time'] = data['Date/Time'].dt.time
         data['Day'] = data['Date/Time'].dt.dayofweek
         
         # Filtrer les jours ouvrables
-        data = data[data['Day'].isin(self.working_days)]
-        
+        return data[data['Day'].isin(self.working_days)]
+
+    def _daily_attendance(self, data):
+        """Présence journalière (C/In, C/Out, pause) de chaque employé sur tous les jours ouvrables"""
         # Obtenir toutes les entrées/sorties pour calculer les pauses
-        result = data.groupby(['Name', 'Date'], as_index=False).apply(self._process_daily_records)
+        if self.vectorized:
+            result = pd.concat([self._aggregate_daily_records(block)
+                                for block in self._employee_blocks(data)], ignore_index=True)
+        else:
+            result = data.groupby(['Name', 'Date'], as_index=False).apply(self._process_daily_records)
         
         # Créer DataFrame complet avec tous les jours ouvrables
-        all_workdays = pd.date_range(start=data['Date'].min(), end=data['Date'].max(), freq='D')
+        all_workdays = pd.date_range(start=to_dates([data['Date'].min()])[0],
+                                     end=to_dates([data['Date'].max()])[0], freq='D')
         all_workdays = all_workdays[all_workdays.dayofweek.isin(self.working_days)]
         employees = data['Name'].unique()
+        if self.compact:
+            days = (all_workdays - pd.Timestamp(0)).days.astype('int32')
+        else:
+            days = all_workdays.date
         
         # Créer toutes les combinaisons employé-jour
         all_combinations = pd.MultiIndex.from_product(
-            [employees, all_workdays.date],
+            [employees, days],
             names=['Name', 'Date']
         )
         
         full_attendance = pd.DataFrame(index=all_combinations).reset_index()
-        return full_attendance.merge(result, on=['Name', 'Date'], how='left')
+        full_attendance = full_attendance.merge(result, on=['Name', 'Date'], how='left')
+        if self.compact:
+            full_attendance = full_attendance.astype({'C/In': 'Int32', 'C/Out': 'Int32'})
+            full_attendance['pause_duration'] = (
+                full_attendance['pause_duration'] // pd.Timedelta(seconds=1)
+            ).astype('Int32')
+        return full_attendance
+
+    def expand(self, df):
+        """Reconvertit une frame du mode compact vers les types habituels (affichage, rapports)"""
+        df = df.copy()
+        if isinstance(df['Name'].dtype, pd.CategoricalDtype):
+            df['Name'] = df['Name'].astype(object)
+        if pd.api.types.is_integer_dtype(df['Date']):
+            df['Date'] = to_dates(df['Date']).dt.date.to_numpy()
+        for col in ['C/In', 'C/Out']:
+            if col in df.columns and pd.api.types.is_numeric_dtype(df[col]):
+                seconds = df[col].astype('float64')
+                df[col] = (pd.Timestamp(0) + pd.to_timedelta(seconds, unit='s')).dt.time.where(seconds.notna())
+        if 'pause_duration' in df.columns and pd.api.types.is_numeric_dtype(df['pause_duration']):
+            df['pause_duration'] = pd.to_timedelta(df['pause_duration'].astype('float64'), unit='s')
+        return df
+
+    def bytes_per_day(self, df):
+        """Mémoire occupée par employé-jour, objets Python compris"""
+        return df.memory_usage(deep=True).sum() / max(len(df), 1)
+
+    def _employee_blocks(self, data):
+        """Découpe les pointages en groupes d'employés d'environ chunk_size lignes
+
+        Les journées d'un employé restent dans le même groupe : l'agrégation par groupe donne
+        le même résultat, avec une mémoire de travail bornée par chunk_size.
+        """
+        if len(data) <= self.chunk_size:
+            yield data
+            return
+        codes, _ = pd.factorize(data['Name'])
+        codes[codes < 0] = 0  # Noms vides : ignorés par l'agrégation, peu importe leur groupe
+        rows_per_employee = np.bincount(codes)
+        block_of_employee = np.cumsum(rows_per_employee) // self.chunk_size
+        block_of_row = block_of_employee[codes]
+        for block in np.unique(block_of_employee):
+            yield data[block_of_row == block]
+
+    def _aggregate_daily_records(self, data):
+        """Version colonne de _process_daily_records pour tous les employés-jours à la fois"""
+        keys = ['Name', 'Date']
+        days = data.groupby(keys, observed=True).size().index
+        punches = self._rank_punches(data)
+        entries = punches[punches['Status'] == 'C/In']
+        exits = punches[punches['Status'] == 'C/Out']
+
+        daily = pd.DataFrame({
+            'C/In': entries[entries['Rank'] == 0].set_index(keys)['Time'].reindex(days),
+            'C/Out': exits.drop_duplicates(keys, keep='last').set_index(keys)['Time'].reindex(days),
+        })
+        # Journées sans aucun C/In ni C/Out : check incomplet
+        daily['pause_duration'] = self._calculate_pause_durations(punches).reindex(days).fillna(self.pause_penalty)
+        return daily.reset_index()
+
+    def _rank_punches(self, data):
+        """Trie une seule fois tous les pointages et numérote chaque statut dans sa journée"""
+        punches = data[data['Status'].isin(['C/In', 'C/Out'])].sort_values('Date/Time', kind='stable')
+        return punches.assign(Rank=punches.groupby(['Name', 'Date', 'Status'], observed=True).cumcount())
+
+    def _calculate_pause_durations(self, punches):
+        """Version colonne de _calculate_pause_duration sur les pointages numérotés"""
+        # Les deux premiers C/In et C/Out de chaque journée, côte à côte
+        bounds = (punches[punches['Rank'] <= 1]
+                  .set_index(['Name', 'Date', 'Status', 'Rank'])['Date/Time']
+                  .unstack(['Status', 'Rank'])
+                  .reindex(columns=pd.MultiIndex.from_product([['C/In', 'C/Out'], [0, 1]]))
+                  .astype(punches['Date/Time'].dtype))
+
+        # Pause entre la première sortie et la deuxième entrée, s'il y en a au moins deux
+        complete = bounds[('C/In', 1)].notna() & bounds[('C/Out', 1)].notna()
+        return self._pause_rules(bounds[('C/Out', 0)], bounds[('C/In', 1)], complete)
+
+    def _pause_rules(self, pause_start, pause_end, complete):
+        """Applique les règles de _calculate_pause_duration à des colonnes de bornes de pause"""
+        start, has_start = column_seconds(pause_start)
+        end, has_end = column_seconds(pause_end)
+        low, high = to_seconds(self.pause_min_time), to_seconds(self.pause_max_time)
+        in_window = has_start & has_end & (low <= start) & (start <= high) & (low <= end) & (end <= high)
+
+        duration, _ = column_seconds(pause_end - pause_start)
+        pause = np.where(duration > 0, duration, to_seconds(self.standard_pause))
+        pause = np.where(in_window, pause, to_seconds(self.standard_pause + self.pause_outside_penalty))
+        pause = np.where(complete, pause, to_seconds(self.pause_penalty))
+        return to_timedelta(pause, index=pause_start.index)
     
     
 
@@ -258,37 +666,63 @@ class PresenceAnalyzer:
         pause_duration = pause_end - pause_start
         return pause_duration if pause_duration > timedelta(0) else self.standard_pause
         
-    def complete_missing_data(self, df):
+    def complete_missing_data(self, df, with_counts=False):
         """Complete missing check-in/out times"""
         print("2. Complétion des données manquantes...")
-        
-        def complete_times(row):
-            # Si les deux sont manquants, on laisse tel quel (absence)
-            if pd.isnull(row['C/In']) and pd.isnull(row['C/Out']):
+
+        # Une seule borne manquante : l'autre est complétée (deux manquantes = absence)
+        missing_in = df['C/In'].isnull() & df['C/Out'].notnull()
+        missing_out = df['C/Out'].isnull() & df['C/In'].notnull()
+
+        if self.vectorized:
+            # Complétion en place par masque, les colonnes gardent leur type
+            df.loc[missing_in, 'C/In'] = self._fill_value(df['C/In'], self.default_entry)
+            df.loc[missing_out, 'C/Out'] = self._fill_value(df['C/Out'], self.default_exit)
+            completed_df = df
+        else:
+            def complete_times(row):
+                # Si les deux sont manquants, on laisse tel quel (absence)
+                if pd.isnull(row['C/In']) and pd.isnull(row['C/Out']):
+                    return row
+                # Si entrée manquante
+                elif pd.isnull(row['C/In']):
+                    row['C/In'] = self.default_entry
+                # Si sortie manquante
+                elif pd.isnull(row['C/Out']):
+                    row['C/Out'] = self.default_exit
                 return row
-            # Si entrée manquante
-            elif pd.isnull(row['C/In']):
-                row['C/In'] = self.default_entry
-            # Si sortie manquante
-            elif pd.isnull(row['C/Out']):
-                row['C/Out'] = self.default_exit
-            return row
-        
-        # Appliquer la complétion
-        completed_df = df.apply(complete_times, axis=1)
+
+            # Appliquer la complétion
+            completed_df = df.apply(complete_times, axis=1)
         
         # S'assurer que la pause_duration existe
         if 'pause_duration' not in completed_df.columns:
             completed_df['pause_duration'] = self.standard_pause
-            
+
+        if with_counts:
+            counts = pd.DataFrame({
+                'Name': df['Name'],
+                'Entrees_Completees': missing_in,
+                'Sorties_Completees': missing_out
+            }).groupby('Name', sort=False, observed=True).sum().reset_index()
+            return completed_df, counts
         return completed_df
 
+    def _fill_value(self, column, t):
+        """Heure par défaut dans la représentation de la colonne (secondes en mode compact)"""
+        if pd.api.types.is_numeric_dtype(column):
+            return to_seconds(t)
+        return t
+
     def calculate_statistics(self, df):
         """Calculate attendance statistics"""
         print("4. Calcul des statistiques de présence...")
         
         if df.empty:
             return pd.DataFrame()
+
+        if self.vectorized:
+            return self._calculate_statistics_columns(df)
             
         def process_day(row):
             # Vérifier si l'employé est actif
@@ -353,7 +787,7 @@ class PresenceAnalyzer:
             # Calcul des pénalités
             penalites = self._calculate_penalties(row['C/In'])
             
-            return pd.Series({
+            result = {
                 'Name': row['Name'],
                 'Date': row['Date'],
                 'Retard': bilan['retard'],
@@ -363,10 +797,94 @@ class PresenceAnalyzer:
                 'Pause_Effective': pause_effective,
                 'Temps_Travail': bilan['temps_travail'],
                 'Penalites': penalites
-            })
+            }
+            # Pointages inversés : hors du bilan, signalés pour correction
+            if self._is_reversed(row['C/In'], row['C/Out']):
+                result['Pointages_Inverses'] = True
+            return pd.Series(result)
         
         return df.apply(process_day, axis=1)
 
+    def _calculate_statistics_columns(self, df):
+        """Version colonne de process_day : chaque règle est évaluée sur toute la colonne"""
+        # Toutes les heures et durées en secondes entières (voir time_kernel)
+        entry, has_entry = column_seconds(df['C/In'])
+        exit_, has_exit = column_seconds(df['C/Out'])
+        present = has_entry & has_exit
+        start = to_seconds(self.standard_start)
+        standard_duration = to_seconds(self.standard_duration)
+        standard_pause = to_seconds(self.standard_pause)
+
+        # Retard (seulement utile pour la pause réduite)
+        retard = np.where(has_entry, span(start, entry), 0)
+
+        # Bilan journalier (_calculate_daily_balance), sans les pointages inversés
+        reversed_pair = present & (exit_ < entry)
+        working = span(entry, exit_) - standard_pause
+        full_day = present & ~reversed_pair & (working >= standard_duration)
+        short_day = present & ~reversed_pair & ~full_day
+        extra = np.where(full_day, working - standard_duration, 0)
+        night = exit_ >= to_seconds(self.night_threshold)
+
+        # Pause effective (_calculate_effective_pause)
+        if 'pause_duration' in df.columns:
+            pause, _ = column_seconds(df['pause_duration'])
+        else:
+            pause = np.full(len(df), standard_pause)
+        reduced = np.maximum(pause, to_seconds(self.reduced_pause))
+        pause_effective = np.where(pause > to_seconds(self.max_pause_allowed), pause, standard_pause)
+        pause_effective = np.where(retard >= to_seconds(self.large_late_threshold), reduced, pause_effective)
+        pause_effective = np.where(has_entry, pause_effective, standard_pause)
+
+        # Départ anticipé et pénalités
+        depart_anticipe = np.where(has_exit, span(exit_, to_seconds(self.standard_end)), 0)
+        late = has_entry & (entry - start >= to_seconds(self.late_threshold))
+        penalites = np.where(late, to_seconds(self.weekly_late_penalty), 0)
+
+        seconds = {
+            'Retard': np.where(short_day, standard_duration - working, 0),
+            'Depart_Anticipe': depart_anticipe,
+            'Heures_Sup_50': np.where(night, 0, extra),
+            'Heures_Sup_100': np.where(night, extra, 0),
+            'Pause_Effective': pause_effective,
+            'Temps_Travail': np.where(full_day, standard_duration, np.where(short_day, working, 0)),
+            'Penalites': penalites
+        }
+        stats = pd.DataFrame({'Name': df['Name'], 'Date': df['Date']})
+        for column, values in seconds.items():
+            stats[column] = to_timedelta(values, index=df.index)
+
+        # Jours de repos puis employés inactifs (prioritaires, comme dans process_day)
+        status = self._calendar_for(df).status(df['Name'], df['Date'])
+        inactive = (status & AttendanceCalendar.INACTIVE) != 0
+        rest = ((status & AttendanceCalendar.REST) != 0) & ~inactive
+
+        columns = list(stats.columns)
+        if rest.any():
+            stats.loc[rest, columns[2:]] = pd.Timedelta(0)
+            stats['Jour_Repos'] = pd.Series(True, index=df.index, dtype=object).where(rest)
+        if inactive.any():
+            stats.loc[inactive, columns[2:]] = pd.NaT
+            stats.loc[inactive, ['Retard', 'Temps_Travail']] = pd.Timedelta(0)
+            stats['Status'] = pd.Series('Inactif', index=df.index).where(inactive)
+        flagged = reversed_pair & ~rest & ~inactive
+        if flagged.any():
+            stats['Pointages_Inverses'] = pd.Series(True, index=df.index, dtype=object).where(flagged)
+
+        # Comme df.apply : colonnes triées dès que des lignes de formes différentes coexistent
+        kinds = [(~rest & ~inactive & ~flagged).any(), flagged.any(), rest.any(), inactive.any()]
+        if sum(kinds) > 1:
+            return stats[sorted(stats.columns)]
+        if kinds[1]:
+            stats['Pointages_Inverses'] = True
+            return stats
+        if kinds[2]:
+            stats['Jour_Repos'] = True
+            return stats[columns[:-1] + ['Jour_Repos', 'Penalites']]
+        if kinds[3]:
+            return stats[['Name', 'Date', 'Retard', 'Temps_Travail', 'Status']]
+        return stats
+
     def _calculate_late(self, entry_time):
         """Calcule le retard"""
         if pd.isnull(entry_time) or entry_time <= self.standard_start:
@@ -424,17 +942,25 @@ class PresenceAnalyzer:
         """Calcule les pénalités de retard hebdomadaires"""
         print("3. Calcul des pénalités de retard...")
         
-        # Grouper les données par employé et par semaine
-        df['Week'] = pd.to_datetime(df['Date']).dt.isocalendar().week
-        df['Year'] = pd.to_datetime(df['Date']).dt.isocalendar().year
-        
+        # Semaine ISO de chaque jour, sans ajouter de colonnes au DataFrame appelant
+        iso = to_dates(df['Date']).dt.isocalendar()
+        keys = [df['Name'], iso['year'].rename('Year'), iso['week'].rename('Week')]
+
+        if self.vectorized:
+            # Colonne booléenne "en retard" puis comptage par employé et par semaine
+            entry, has_entry = column_seconds(df['C/In'])
+            late = has_entry & (entry - to_seconds(self.standard_start) >= to_seconds(self.late_threshold))
+            late_count = pd.Series(late, index=df.index).groupby(keys, observed=True).sum()
+            penalties = (late_count - 1).clip(lower=0) * self.weekly_late_penalty
+            return penalties.reset_index(name='Weekly_Penalties')
+
         def calculate_week_penalties(group):
             late_count = sum(1 for time in group['C/In'] 
                            if pd.notnull(time) and 
                            self._time_diff(self.standard_start, time) >= self.late_threshold)
             return self.weekly_late_penalty * (late_count - 1) if late_count > 1 else timedelta(0)
         
-        penalties = df.groupby(['Name', 'Year', 'Week']).apply(calculate_week_penalties)
+        penalties = df.groupby(keys).apply(calculate_week_penalties)
         return penalties.reset_index(name='Weekly_Penalties')
 
     def _calculate_penalties(self, entry_time):
@@ -471,12 +997,8 @@ class PresenceAnalyzer:
         return self.workday_duration  # Si égal ou plus de 8h30
 
     def _time_diff(self, time1, time2):
-        """Calcule la différence entre deux temps"""
-        if isinstance(time1, time):
-            time1 = datetime.combine(datetime.min, time1)
-        if isinstance(time2, time):
-            time2 = datetime.combine(datetime.min, time2)
-        return abs(time2 - time1)
+        """Durée de time1 à time2, nulle si time2 est antérieur (voir time_kernel.span)"""
+        return timedelta(seconds=int(span(to_seconds(time1), to_seconds(time2))))
 
     def get_holidays(self):
         """Get holiday dates from user input"""
@@ -521,25 +1043,41 @@ class PresenceAnalyzer:
         """Check if a date falls within leave periods"""
         return any(start <= date <= end for start, end, _ in leave_periods)
 
-    def calculate_net_absences(self, absence_details, holidays, employee_leave_periods):
+    def calculate_net_absences(self, absence_details, holidays, employee_leave_periods, with_covered=False):
         """Calculate net absences considering holidays and leave"""
         print("Calcul des absences nettes...")
-        
-        net_absences = []
-        for _, row in absence_details.iterrows():
-            date = pd.to_datetime(row['Date']).date()
-            if (date not in holidays and 
-                not self.is_leave_day(date, employee_leave_periods.get(row['Name'], []))):
-                net_absences.append(row)
 
-        net_absences_df = pd.DataFrame(net_absences)
+        if self.vectorized or with_covered:
+            # Lecture des jours fériés et congés dans le calendrier de l'analyse
+            calendar = self._calendar_for(absence_details, holidays, employee_leave_periods)
+            status = calendar.status(absence_details['Name'], absence_details['Date'])
+            covered = absence_details.assign(
+                Jour_Ferie=(status & AttendanceCalendar.HOLIDAY) != 0,
+                Type_Conge=calendar.leave_type(status)
+            )
+            is_covered = covered['Jour_Ferie'] | covered['Type_Conge'].notna()
+            covered = covered[is_covered]
+
+        if self.vectorized:
+            net_absences_df = absence_details[~is_covered]
+        else:
+            net_absences = []
+            for _, row in absence_details.iterrows():
+                date = pd.to_datetime(row['Date']).date()
+                if (date not in holidays and 
+                    not self.is_leave_day(date, employee_leave_periods.get(row['Name'], []))):
+                    net_absences.append(row)
+            net_absences_df = pd.DataFrame(net_absences)
+
         if not net_absences_df.empty:
-            net_absences_total = (net_absences_df.groupby('Name')
+            net_absences_total = (net_absences_df.groupby('Name', observed=True)
                                 .size()
                                 .reset_index(name='Total Absences Nettes'))
         else:
             net_absences_total = pd.DataFrame(columns=['Name', 'Total Absences Nettes'])
-        
+
+        if with_covered:
+            return net_absences_df, net_absences_total, covered
         return net_absences_df, net_absences_total
 
     def generate_monthly_report(self, df, month, year):
@@ -547,7 +1085,7 @@ class PresenceAnalyzer:
         print(f"Génération du rapport pour {month}/{year}")
         
         # Convertir la colonne Date en datetime si ce n'est pas déjà fait
-        df['Date'] = pd.to_datetime(df['Date'])
+        df['Date'] = to_dates(df['Date'])
         
         # Filtrer les données pour le mois et l'année spécifiés
         monthly_data = df[
@@ -567,23 +1105,6 @@ class PresenceAnalyzer:
         """Save all results to Excel file"""
         print(f"\nSauvegarde des résultats dans {output_file}...")
 
-        def format_timedelta(td):
-            if pd.isnull(td) or td == timedelta(0):
-                return "00:00"
-            total_seconds = int(td.total_seconds())
-            hours = total_seconds // 3600
-            minutes = (total_seconds % 3600) // 60
-            return f"{hours:02d}:{minutes:02d}"
-
-        # Préparation des rapports quotidiens
-        daily_stats = stats.copy()
-        time_columns = ['Retard', 'Depart_Anticipe', 'Heures_Sup_50', 
-                       'Heures_Sup_100', 'Pause_Effective', 'Temps_Travail', 'Penalites']
-        
-        for col in time_columns:
-            if col in daily_stats.columns:
-                daily_stats[col] = daily_stats[col].apply(format_timedelta)
-
         # Calculer les absences
         absences = stats[stats['Temps_Travail'] == timedelta(0)][['Name', 'Date']]
         
@@ -616,24 +1137,18 @@ class PresenceAnalyzer:
             'Penalites': 'sum'
         }).reset_index()
 
-        for col in monthly_stats.columns:
-            if col != 'Name':
-                monthly_stats[col] = monthly_stats[col].apply(format_timedelta)
-
-        # Sauvegarder tous les rapports
-        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-            daily_stats.to_excel(writer, 'Rapport_Quotidien', index=False)
-            monthly_stats.to_excel(writer, 'Statistiques_Mensuelles', index=False)
-            absences.to_excel(writer, 'Absences_Brutes', index=False)
-            net_absences_df.to_excel(writer, 'Absences_Nettes', index=False)
-            net_absences_total.to_excel(writer, 'Total_Absences_Nettes', index=False)
+        # Sauvegarder tous les rapports (durées formatées en HH:MM à l'écriture)
+        with ReportWriter(output_file) as writer:
+            writer.write_sheet('Rapport_Quotidien', stats, DURATION_COLUMNS)
+            writer.write_sheet('Statistiques_Mensuelles', monthly_stats, DURATION_COLUMNS)
+            writer.write_sheet('Absences_Brutes', absences)
+            writer.write_sheet('Absences_Nettes', net_absences_df)
+            writer.write_sheet('Total_Absences_Nettes', net_absences_total)
             
             if not leave_df.empty:
-                leave_df.to_excel(writer, 'Registre_Conges', index=False)
+                writer.write_sheet('Registre_Conges', leave_df)
             
-            pd.DataFrame({'Jours_Feries': holidays}).to_excel(
-                writer, 'Jours_Feries', index=False
-            )
+            writer.write_sheet('Jours_Feries', pd.DataFrame({'Jours_Feries': holidays}))
 
 
 def main():
@@ -656,11 +1171,10 @@ def main():
         # Détecter les jours de repos
         
         print("\nDétection des jours de repos...")
-        for employee in attendance_data['Name'].unique():
-            analyzer.employee_rest_days[employee] = analyzer.detect_and_manage_rest_days(
-                attendance_data, 
-                employee
-            )
+        days_map = ["Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche"]
+        analyzer.employee_rest_days.update(analyzer.detect_rest_days(attendance_data))
+        for employee, rest_days in analyzer.employee_rest_days.items():
+            print(f"- {employee}: {', '.join(days_map[day] for day in rest_days)}")
         # Récupérer les congés pour chaque employé
         employee_leave_periods = {}
         for employee in completed_data['Name'].unique():
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+
+from analysis_cache import write_atomic
+
+# Métadonnées du fichier Arrow : empreinte de la source et options de normalisation
+METADATA_KEY = b'presence_punches'
+PUNCH_CACHE_SUFFIX = '.pointages.arrow'
+
+
+def file_hash(path, chunk_size=2**20):
+    """Empreinte SHA-256 d'un fichier, lu par blocs"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def punch_cache_path(source, digest, directory=None):
+    """Fichier du cache : à côté de la source, ou <empreinte>.pointages.arrow dans directory"""
+    if directory is None:
+        return source + PUNCH_CACHE_SUFFIX
+    return os.path.join(directory, digest + PUNCH_CACHE_SUFFIX)
+
+
+def load_punches(path, fingerprint):
+    """Pointages normalisés lus par projection mémoire (sans copie des colonnes numériques)
+
+    Renvoie None si pyarrow n'est pas installé, si le fichier manque ou s'il a été écrit
+    pour une autre source ou d'autres options (fingerprint différent).
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+    except (OSError, pa.ArrowInvalid):
+        return None
+    metadata = table.schema.metadata or {}
+    if metadata.get(METADATA_KEY) != _encode(fingerprint):
+        return None
+
+    # Date d'accès pour le nettoyage des caches inutilisés
+    os.utime(path)
+    return table.to_pandas(split_blocks=True)
+
+
+def save_punches(path, df, fingerprint):
+    """Enregistre les pointages normalisés au format Arrow IPC non compressé (projetable)
+
+    Sans pyarrow, rien n'est écrit : le fichier source sera relu à l'analyse suivante.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), METADATA_KEY: _encode(fingerprint)})
+
+    def write(temp_path):
+        with pa.OSFile(temp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Écriture atomique : une analyse concurrente ne lit jamais un fichier partiel
+    write_atomic(path, write)
+
+
+def _encode(fingerprint):
+    return json.dumps(fingerprint, sort_keys=True).encode('utf-8')
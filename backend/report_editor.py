@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+from report_writer import DURATION_COLUMNS, format_durations, parse_durations
+
+# Colonnes du résumé par employé du rapport modifié
+SUMMARY_COLUMNS = ['Retard', 'Heures_Sup_50', 'Heures_Sup_100', 'Temps_Travail', 'Penalites']
+
+
+def date_keys(values):
+    """Date "AAAA-MM-JJ" d'une colonne de dates (dates, Timestamp ou texte ISO)"""
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.strftime('%Y-%m-%d')
+    return values.astype(str).str[:10]
+
+
+class EditableReport:
+    """Données journalières d'un rapport, modifiées par lots
+
+    Les lignes sont retrouvées par un index (employé, date) construit une fois, et les
+    totaux par employé sont tenus à jour à partir des anciennes et nouvelles valeurs :
+    appliquer n modifications coûte O(n), quelle que soit la taille du rapport.
+    Les colonnes de durée sont converties en Timedelta ("HH:MM" importés, secondes de /upload).
+    """
+
+    def __init__(self, records):
+        self.df = pd.DataFrame(records)
+        self.duration_columns = [col for col in DURATION_COLUMNS if col in self.df.columns]
+        for col in self.duration_columns:
+            self.df[col] = parse_durations(self.df[col]).to_numpy()
+
+        keys = pd.MultiIndex.from_arrays([self.df['Name'].astype(str), date_keys(self.df['Date'])])
+        # Une seule ligne par employé et par date : la première en cas de doublon
+        self.positions = pd.Series(np.arange(len(self.df)), index=keys)
+        self.positions = self.positions[~keys.duplicated()]
+
+        summary_columns = [col for col in SUMMARY_COLUMNS if col in self.duration_columns]
+        self.totals = self.df.groupby(self.df['Name'].astype(str))[summary_columns].sum()
+
+    def apply(self, employee, modifications):
+        """Applique les modifications ({date, field, new_value}) d'un employé en une fois
+
+        Pour une même date et un même champ, la dernière modification l'emporte. Les
+        modifications d'une date absente du rapport sont ignorées ; renvoie le nombre appliqué.
+        """
+        if not modifications:
+            return 0
+        mods = pd.DataFrame(modifications)
+        mods['key'] = date_keys(mods['date'])
+        mods = mods.drop_duplicates(['key', 'field'], keep='last')
+
+        targets = pd.MultiIndex.from_arrays([[employee] * len(mods), mods['key']])
+        rows = self.positions.reindex(targets).to_numpy()
+        found = ~np.isnan(rows)
+        mods, rows = mods[found], rows[found].astype('int64')
+
+        for field, indexer in mods.groupby('field').indices.items():
+            field_rows = rows[indexer]
+            values = mods['new_value'].iloc[indexer]
+            if field not in self.df.columns:
+                self.df[field] = None
+            if field in self.duration_columns:
+                values = parse_durations(values.reset_index(drop=True))
+                column = self.df.columns.get_loc(field)
+                old = self.df.iloc[field_rows, column].fillna(pd.Timedelta(0)).to_numpy()
+                if field in self.totals.columns:
+                    delta = (values.fillna(pd.Timedelta(0)).to_numpy() - old).sum()
+                    self.totals.loc[employee, field] += delta
+                self.df.iloc[field_rows, column] = values.to_numpy()
+            else:
+                if not pd.api.types.is_object_dtype(self.df[field]):
+                    self.df[field] = self.df[field].astype(object)
+                self.df.iloc[field_rows, self.df.columns.get_loc(field)] = values.to_numpy()
+        return len(mods)
+
+    def summary(self, employee):
+        """Totaux de l'employé au format HH:MM (une ligne)"""
+        totals = self.totals.loc[[employee]] if employee in self.totals.index else self.totals.iloc[:0]
+        summary = totals.reset_index()
+        for col in totals.columns:
+            summary[col] = format_durations(summary[col])
+        return summary
@@ -0,0 +1,164 @@
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from analysis_cache import write_atomic
+from time_kernel import column_seconds
+
+# Tables d'un rapport (DataFrame par feuille), d'où sont générés classeur et exports
+REPORT_TABLES_FILE = 'tables.pkl'
+
+# Formats de téléchargement : nom du fichier généré et type MIME
+EXPORT_FORMATS = {
+    'xlsx': ('rapport.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('rapport.csv.zip', 'application/zip'),
+    'parquet': ('{table}.parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('{table}.arrow', 'application/vnd.apache.arrow.file'),
+}
+
+# Colonnes de durée des statistiques, écrites au format HH:MM
+DURATION_COLUMNS = ['Retard', 'Depart_Anticipe', 'Heures_Sup_50', 'Heures_Sup_100',
+                    'Pause_Effective', 'Temps_Travail', 'Penalites']
+
+
+def format_durations(series):
+    """Formate une colonne de durées en HH:MM d'un seul tenant
+
+    Même résultat que format_timedelta appliqué valeur par valeur : "00:00" pour une
+    durée vide ou nulle, heures au-delà de 24 conservées.
+    """
+    seconds = pd.to_timedelta(series).dt.total_seconds().fillna(0).to_numpy()
+    seconds = np.trunc(seconds).astype('int64')
+    hours = pd.Series(seconds // 3600, index=series.index).astype(str).str.zfill(2)
+    minutes = pd.Series((seconds % 3600) // 60, index=series.index).astype(str).str.zfill(2)
+    return hours + ':' + minutes
+
+
+def parse_durations(series):
+    """Inverse de format_durations : durées (Timedelta) d'une colonne saisie ou importée
+
+    Accepte "HH:MM" (heures négatives ou au-delà de 24 comprises), "HH:MM:SS", les
+    durées pandas et les nombres de secondes (réponses JSON de /upload). Vide -> NaT.
+    """
+    series = pd.Series(series)
+    if pd.api.types.is_timedelta64_dtype(series):
+        return series
+    if pd.api.types.is_numeric_dtype(series):
+        return pd.to_timedelta(series, unit='s')
+
+    text = series.astype(object).where(series.notna(), None).astype(str).str.strip()
+    # Durées vides ("NaT" des employés inactifs dans les réponses de /upload)
+    missing = text.isin(['', 'NaT', 'nan', 'NaN', 'None', '<NA>']).to_numpy()
+    parts = text.str.extract(r'^(-?\d+):(\d{2})(?::(\d{2}))?$').astype('float64')
+    seconds = (parts[0] * 3600 + parts[1] * 60 + parts[2].fillna(0)).to_numpy(dtype='float64', copy=True)
+
+    # Autres écritures ("1 days 02:00:00", secondes en texte)
+    other = np.isnan(seconds) & ~missing
+    if other.any():
+        numbers = pd.to_numeric(text[other], errors='coerce').astype('float64').to_numpy()
+        durations = pd.to_timedelta(text[other].where(np.isnan(numbers)), errors='coerce')
+        seconds[other] = np.where(np.isnan(numbers), durations.dt.total_seconds().to_numpy(), numbers)
+    return pd.to_timedelta(pd.Series(seconds, index=series.index), unit='s')
+
+
+class ReportWriter:
+    """Classeur Excel écrit feuille par feuille en mode écriture seule (openpyxl)
+
+    Les lignes sont envoyées directement dans le fichier au lieu de construire chaque
+    feuille en mémoire comme pd.ExcelWriter ; les durées sont formatées par colonne.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.workbook.save(self.path)
+        self.workbook.close()
+
+    def write_sheet(self, name, df, duration_columns=()):
+        """Ajoute une feuille : en-têtes puis lignes du DataFrame, sans l'index"""
+        sheet = self.workbook.create_sheet(name)
+        if df is None or len(df.columns) == 0:
+            return
+
+        columns = {}
+        for col in df.columns:
+            if col in duration_columns:
+                columns[col] = format_durations(df[col])
+            else:
+                # Cellules vides pour NaN / NaT / None, comme to_excel
+                values = df[col].astype(object)
+                columns[col] = values.where(df[col].notna(), None)
+
+        sheet.append([str(col) for col in df.columns])
+        for row in zip(*(values.tolist() for values in columns.values())):
+            sheet.append(row)
+
+
+def save_report_tables(tables, directory):
+    """Enregistre les tables d'un rapport (nom de feuille -> DataFrame) dans directory"""
+    os.makedirs(directory, exist_ok=True)
+    write_atomic(os.path.join(directory, REPORT_TABLES_FILE), lambda path: pd.to_pickle(tables, path))
+
+
+def load_report_tables(directory):
+    return pd.read_pickle(os.path.join(directory, REPORT_TABLES_FILE))
+
+
+def numeric_durations(df):
+    """Copie du DataFrame où les durées deviennent des secondes entières (vides conservés)"""
+    df = df.copy()
+    for col in df.columns:
+        if pd.api.types.is_timedelta64_dtype(df[col]):
+            seconds, valid = column_seconds(df[col])
+            df[col] = pd.Series(seconds, index=df.index).astype('Int64').where(valid)
+    return df
+
+
+def export_report(directory, export_format, table='Statistiques_Detaillees'):
+    """Fichier d'un rapport au format demandé, généré à la première demande puis réutilisé
+
+    xlsx : classeur complet (durées en HH:MM). csv : archive zip d'un CSV par table.
+    parquet / arrow : une table, durées en secondes. Renvoie le chemin du fichier.
+    Lève KeyError pour un format ou une table inconnus.
+    """
+    filename, _ = EXPORT_FORMATS[export_format]
+    per_table = '{table}' in filename
+    if per_table and not table.isidentifier():
+        raise KeyError(table)
+
+    path = os.path.join(directory, filename.format(table=table))
+    if os.path.exists(path):
+        return path
+
+    tables = load_report_tables(directory)
+    if per_table and table not in tables:
+        raise KeyError(table)
+
+    if export_format == 'xlsx':
+        def write(temp_path):
+            with ReportWriter(temp_path) as writer:
+                for name, df in tables.items():
+                    writer.write_sheet(name, df, DURATION_COLUMNS)
+    elif export_format == 'csv':
+        def write(temp_path):
+            with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for name, df in tables.items():
+                    archive.writestr(f"{name}.csv", numeric_durations(df).to_csv(index=False))
+    elif export_format == 'parquet':
+        def write(temp_path):
+            numeric_durations(tables[table]).to_parquet(temp_path, index=False)
+    else:
+        def write(temp_path):
+            numeric_durations(tables[table]).reset_index(drop=True).to_feather(temp_path)
+
+    write_atomic(path, write)
+    return path
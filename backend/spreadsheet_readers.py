@@ -0,0 +1,82 @@
+import importlib.util
+import zipfile
+
+import pandas as pd
+
+# Signatures en tête de fichier : classeur .xls (OLE2) et archive zip (.xlsx)
+OLE2_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+ZIP_SIGNATURE = b'PK\x03\x04'
+
+# Moteurs pandas.read_excel par format, du plus rapide au plus lent
+READER_BACKENDS = {
+    'xls': ['calamine', 'xlrd'],
+    'xlsx': ['calamine', 'openpyxl'],
+}
+
+# Module Python requis par chaque moteur
+BACKEND_MODULES = {
+    'calamine': 'python_calamine',
+    'xlrd': 'xlrd',
+    'openpyxl': 'openpyxl',
+}
+
+# Version de pandas à partir de laquelle read_excel accepte le moteur
+BACKEND_PANDAS_VERSIONS = {
+    'calamine': (2, 2),
+}
+
+
+def detect_format(path):
+    """Format réel d'un fichier d'après son contenu, quelle que soit son extension
+
+    Renvoie 'xls', 'xlsx', 'ndjson' ou 'csv'. Lève ValueError pour une archive zip qui
+    n'est pas un classeur ou un fichier binaire inconnu.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(4096)
+
+    if head.startswith(OLE2_SIGNATURE):
+        return 'xls'
+    if head.startswith(ZIP_SIGNATURE):
+        try:
+            with zipfile.ZipFile(path) as archive:
+                is_workbook = 'xl/workbook.xml' in archive.namelist()
+        except zipfile.BadZipFile:
+            is_workbook = False
+        if not is_workbook:
+            raise ValueError("Archive zip qui n'est pas un classeur Excel")
+        return 'xlsx'
+    if b'\0' in head:
+        raise ValueError("Format de fichier non reconnu")
+
+    # Journal texte : un objet JSON par ligne, sinon CSV
+    text = head.lstrip(b'\xef\xbb\xbf \t\r\n')
+    return 'ndjson' if text.startswith(b'{') else 'csv'
+
+
+def available_backends(file_format):
+    """Moteurs installés pour un format de classeur, du plus rapide au plus lent"""
+    pandas_version = tuple(int(part) for part in pd.__version__.split('.')[:2])
+    return [
+        backend for backend in READER_BACKENDS.get(file_format, [])
+        if importlib.util.find_spec(BACKEND_MODULES[backend]) is not None
+        and pandas_version >= BACKEND_PANDAS_VERSIONS.get(backend, (0, 0))
+    ]
+
+
+def read_spreadsheet(path, sheet_name=0, usecols=None, backend=None):
+    """Lit une feuille de classeur avec le moteur le plus rapide disponible pour son format
+
+    usecols limite la lecture aux colonnes nommées. backend force un moteur précis
+    (mesures de performances) ; ValueError s'il ne convient pas au format du fichier.
+    """
+    file_format = detect_format(path)
+    backends = available_backends(file_format)
+    if not backends:
+        raise ValueError(f"Aucun moteur de lecture disponible pour le format {file_format}")
+    if backend is None:
+        backend = backends[0]
+    elif backend not in backends:
+        raise ValueError(f"Moteur {backend} indisponible pour le format {file_format}")
+
+    return pd.read_excel(path, sheet_name=sheet_name, usecols=usecols, engine=backend)
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+
+
+def to_seconds(value):
+    """Secondes depuis minuit pour une heure, ou secondes d'une durée (timedelta)"""
+    if isinstance(value, timedelta):
+        return int(value.total_seconds())
+    if isinstance(value, datetime):
+        value = value.time()
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def column_seconds(series):
+    """Convertit une colonne d'heures ou de durées en (secondes int64, masque des valeurs présentes)
+
+    Accepte les durées (timedelta64), les horodatages (heure de la journée), les secondes
+    du mode compact et les objets datetime.time.
+    """
+    valid = series.notna().to_numpy()
+    if pd.api.types.is_timedelta64_dtype(series):
+        seconds = series.fillna(pd.Timedelta(0)) // pd.Timedelta(seconds=1)
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        seconds = (series - series.dt.normalize()).fillna(pd.Timedelta(0)) // pd.Timedelta(seconds=1)
+    elif pd.api.types.is_numeric_dtype(series):
+        seconds = series.fillna(0)
+    else:
+        # Peu d'heures distinctes : on ne convertit que les valeurs uniques
+        codes, uniques = pd.factorize(series)
+        lookup = np.array([to_seconds(t) for t in uniques] + [0], dtype='int64')
+        return lookup[codes], valid
+    return seconds.to_numpy(dtype='int64'), valid
+
+
+def span(start, end):
+    """Durée de start à end en secondes, 0 si end est antérieur à start
+
+    Les pointages inversés ne sont pas corrigés ici : l'appelant les repère (end < start)
+    et les signale.
+    """
+    return np.maximum(np.subtract(end, start), 0)
+
+
+def to_timedelta(seconds, index=None):
+    """Secondes (scalaire ou tableau) vers timedelta pandas"""
+    if np.ndim(seconds) == 0:
+        return pd.Timedelta(seconds=int(seconds))
+    return pd.Series(pd.to_timedelta(np.asarray(seconds, dtype='int64'), unit='s'), index=index)
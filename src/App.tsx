@@ -32,6 +32,7 @@ interface DetailedStats {
     temps_travail: string;
     jours_travailles: number;
   }>;
+  daily_records?: Array<Record<string, any>>;
 }
 
 interface AnalysisResult {
@@ -47,9 +48,78 @@ interface AnalysisResult {
     }
   };
   detailed_stats: DetailedStats;
+  absences?: Array<{ Name: string; Date: string }>;
+  conges?: Array<Record<string, any>>;
   message: string;
 }
 
+// Résultat vide affiché dès le début de /upload/stream, complété employé par employé
+const emptyResult = (filename: string, employees: number): AnalysisResult => ({
+  status: 'streaming',
+  filename,
+  report_id: '',
+  analysis: { total_records: 0, employees, date_range: { start: '', end: '' } },
+  detailed_stats: {
+    total_retards: '00:00',
+    total_heures_sup_50: '00:00',
+    total_heures_sup_100: '00:00',
+    total_temps_travail: '00:00',
+    moyenne_temps_travail: '00:00',
+    stats_par_employe: [],
+    daily_records: [],
+  },
+  message: '',
+});
+
+// Ajoute au résultat partiel un événement "employee" de /upload/stream
+const appendEmployee = (result: AnalysisResult, data: any): AnalysisResult => {
+  const dates = data.daily_records.map((record: any) => String(record.Date).slice(0, 10)).sort();
+  const { start, end } = result.analysis.date_range;
+  return {
+    ...result,
+    analysis: {
+      ...result.analysis,
+      total_records: result.analysis.total_records + data.daily_records.length,
+      date_range: dates.length === 0 ? result.analysis.date_range : {
+        start: !start || dates[0] < start ? dates[0] : start,
+        end: !end || dates[dates.length - 1] > end ? dates[dates.length - 1] : end,
+      },
+    },
+    detailed_stats: {
+      ...result.detailed_stats,
+      stats_par_employe: [...result.detailed_stats.stats_par_employe, data.stats],
+      daily_records: [...(result.detailed_stats.daily_records || []), ...data.daily_records],
+    },
+  };
+};
+
+// Lit les server-sent events d'une réponse fetch au fil de leur arrivée
+const readEvents = async (
+  response: Response,
+  onEvent: (event: string, data: any) => void
+) => {
+  const reader = response.body!.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let end;
+    while ((end = buffer.indexOf('\n\n')) >= 0) {
+      const message = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+      let event = 'message';
+      let data = '';
+      for (const line of message.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      onEvent(event, JSON.parse(data));
+    }
+  }
+};
+
 
 function App() {
   const [file, setFile] = useState<File | null>(null);
@@ -60,6 +130,7 @@ function App() {
   const [showEmployeeDetails, setShowEmployeeDetails] = useState(false);
   const [showAnalysisForm, setShowAnalysisForm] = useState(false);
   const [employeesList, setEmployeesList] = useState<string[]>([]);
+  const [detectedRestDays, setDetectedRestDays] = useState<RestDay[]>([]);
   const [showReportEditor, setShowReportEditor] = useState(false);
 
   const handleFileChange = async (event: React.ChangeEvent<HTMLInputElement>) => {
@@ -81,6 +152,7 @@ function App() {
         if (response.ok) {
           const data = await response.json();
           setEmployeesList(data.employees);
+          setDetectedRestDays(data.restDays || []);
           setShowAnalysisForm(true);
         } else {
           setUploadStatus('Erreur lors de la lecture du fichier');
@@ -107,20 +179,47 @@ function App() {
       formData.append('file', file);
       formData.append('params', JSON.stringify(data));
 
-      const response = await fetch('http://127.0.0.1:8000/upload', {
+      // Les statistiques s'affichent employé par employé pendant l'analyse
+      const streamResponse = await fetch('http://127.0.0.1:8000/upload/stream', {
         method: 'POST',
         body: formData,
       });
+      if (!streamResponse.ok) {
+        const error = await streamResponse.json();
+        setUploadStatus('Erreur: ' + error.detail);
+        return;
+      }
 
-      const result = await response.json();
-      
-      if (response.ok) {
-        setAnalysisResult(result);
-        setUploadStatus('Fichier analysé avec succès !');
-        setShowAnalysisForm(false);
-      } else {
-        setUploadStatus('Erreur: ' + result.detail);
+      let streamError = null as string | null;
+      let reportReceived = false as boolean;
+      await readEvents(streamResponse, (event, payload) => {
+        if (event === 'start') {
+          setAnalysisResult(emptyResult(file.name, payload.employees.length));
+          setShowAnalysisForm(false);
+        } else if (event === 'employee') {
+          setAnalysisResult(result => result && appendEmployee(result, payload));
+          setUploadStatus(
+            `Analyse en cours : ${payload.progress.done} / ${payload.progress.total} employés...`
+          );
+        } else if (event === 'totals') {
+          setAnalysisResult(result => result && {
+            ...result,
+            detailed_stats: { ...result.detailed_stats, ...payload },
+          });
+          setUploadStatus('Écriture du rapport...');
+        } else if (event === 'report') {
+          // Rapport écrit à partir de la même analyse : identifiant, absences et congés
+          reportReceived = true;
+          setAnalysisResult(result => result && { ...result, ...payload });
+        } else if (event === 'error') {
+          streamError = payload.detail;
+        }
+      });
+      if (streamError || !reportReceived) {
+        setUploadStatus('Erreur: ' + (streamError || 'analyse interrompue'));
+        return;
       }
+      setUploadStatus('Fichier analysé avec succès !');
     } catch (error) {
       setUploadStatus('Erreur de connexion au serveur');
       console.error('Erreur:', error);
@@ -164,7 +263,7 @@ function App() {
   <div className="flex justify-between items-center mb-8">
     <h1 className="text-3xl font-bold">Analyseur de Présence</h1>
     <div className="flex space-x-2">
-      {analysisResult && (
+      {analysisResult?.report_id && (
         <button 
           onClick={handleDownload}
           disabled={isDownloading}
@@ -196,15 +295,15 @@ function App() {
                 id="file-upload"
                 className="hidden"
                 onChange={handleFileChange}
-                accept=".xls,.xlsx"
+                accept=".xls,.xlsx,.csv,.ndjson,.jsonl"
               />
               <label htmlFor="file-upload" className="cursor-pointer">
                 <Upload className="mx-auto w-12 h-12 text-gray-400 mb-4" />
                 <p className="text-gray-600">
-                  Glissez votre fichier Excel ou cliquez pour sélectionner
+                  Glissez votre export de pointages ou cliquez pour sélectionner
                 </p>
                 <p className="text-sm text-gray-500 mt-2">
-                  Formats acceptés : .xls, .xlsx
+                  Formats acceptés : .xls, .xlsx, .csv, .ndjson, .jsonl
                 </p>
               </label>
             </div>
@@ -229,6 +328,7 @@ function App() {
           {showAnalysisForm && (
             <AnalysisForm
               employees={employeesList}
+              detectedRestDays={detectedRestDays}
               onSubmit={handleAnalysisSubmit}
               onCancel={() => {
                 setShowAnalysisForm(false);
@@ -33,9 +33,13 @@ interface AdminEditorProps {
     daily: DailyData[];
   };
   onSaveChanges: (modifications: Modification[]) => void;
+  // Session côté serveur (session_id de /import-report ou de /edit-report/{report_id}) :
+  // seules les modifications sont envoyées pour générer le rapport modifié
+  sessionId?: string;
+  onReportGenerated?: (reportId: string) => void;
 }
 
-const AdminEditor: React.FC<AdminEditorProps> = ({ employeeData, onSaveChanges }) => {
+const AdminEditor: React.FC<AdminEditorProps> = ({ employeeData, onSaveChanges, sessionId, onReportGenerated }) => {
   const [selectedEmployee, setSelectedEmployee] = useState<string | null>(null);
   const [modifications, setModifications] = useState<Modification[]>([]);
   const [editingRow, setEditingRow] = useState<{ date: string; field: string } | null>(null);
@@ -100,8 +104,44 @@ const AdminEditor: React.FC<AdminEditorProps> = ({ employeeData, onSaveChanges }
     setEditedValues({});
   };
 
-  const handleSaveAll = () => {
+  const sendToSession = async (mods: Modification[]) => {
+    // Une requête par employé, avec uniquement ses modifications
+    const employees = Array.from(new Set(mods.map(mod => mod.employeeName)));
+    for (const employee of employees) {
+      const response = await fetch('http://127.0.0.1:8000/generate-modified-report', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          session_id: sessionId,
+          employee,
+          modifications: mods
+            .filter(mod => mod.employeeName === employee)
+            .map(mod => ({
+              date: mod.date,
+              field: mod.field,
+              old_value: mod.oldValue,
+              new_value: mod.newValue
+            }))
+        })
+      });
+      if (!response.ok) {
+        throw new Error('Erreur lors de la génération du rapport modifié');
+      }
+      const result = await response.json();
+      onReportGenerated?.(result.report_id);
+    }
+  };
+
+  const handleSaveAll = async () => {
     if (modifications.length > 0) {
+      if (sessionId) {
+        try {
+          await sendToSession(modifications);
+        } catch (error) {
+          alert(error instanceof Error ? error.message : 'Erreur lors de la sauvegarde');
+          return;
+        }
+      }
       onSaveChanges(modifications);
     }
   };
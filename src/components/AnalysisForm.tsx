@@ -19,6 +19,7 @@ interface LeavePeriod {
 
 interface AnalysisFormProps {
   employees: string[];
+  detectedRestDays?: RestDay[];  // Jours de repos détectés par /employees
   onSubmit: (data: {
     restDays: RestDay[];
     holidays: Holiday[];
@@ -38,9 +39,13 @@ const DAYS_OF_WEEK = [
   { value: 6, label: 'Dimanche' }
 ];
 
-const AnalysisForm: React.FC<AnalysisFormProps> = ({ employees, onSubmit, onCancel }) => {
+const AnalysisForm: React.FC<AnalysisFormProps> = ({ employees, detectedRestDays = [], onSubmit, onCancel }) => {
+  // Pré-rempli avec les jours détectés, vendredi-samedi à défaut
   const [restDays, setRestDays] = useState<RestDay[]>(
-    employees.map(emp => ({ employeeName: emp, days: [4, 5] }))
+    employees.map(emp => ({
+      employeeName: emp,
+      days: detectedRestDays.find(rd => rd.employeeName === emp)?.days ?? [4, 5]
+    }))
   );
   const [holidays, setHolidays] = useState<Holiday[]>([]);
   const [leavePeriods, setLeavePeriods] = useState<LeavePeriod[]>([]);